@@ -1,5 +1,17 @@
 import random
 import math
+import time
+import threading
+from operator import itemgetter
+from match import Match
+from bitboard import BitBoard
+from zobrist import get_zobrist_keys, canonical_hash, mirror_symmetric
+from transposition import TranspositionTable, SharedTranspositionTable, DEFAULT_TT_SIZE, EXACT, LOWER, UPPER
+from batch_eval import HAS_NUMPY, child_boards, score_boards
+from endgame import EndgameSolver, ENDGAME_EMPTY_THRESHOLD
+from book import get_book, position_key
+from mcts import MCTSEngine
+import parallel
 
 # 常量定义，方便后续打分
 EMPTY = 0
@@ -10,20 +22,342 @@ BLOCK = 3         # 障碍物
 # 搜索窗口长度 (4个一连)
 WINDOW_LENGTH = 4
 
+# 终局分数 (minimax 中 AI 赢/输的估值)
+WIN_SCORE = 100000000000
+
+# 固定深度模式下各难度的搜索深度
+FIXED_DEPTH = {"Medium": 2, "Hard": 4}
+# 限时模式 (迭代加深) 下各难度的最大深度，None 表示只受时间和剩余空格数限制
+TIMED_MAX_DEPTH = {"Medium": 2, "Hard": None}
+
+# PVS 相关：分数的最小间隔 (估值都是 0.5 的整数倍)，零窗口搜索的宽度取这个值
+SCORE_GRANULARITY = 0.5
+# 迭代加深时，以上一轮分数为中心的期望窗口半宽
+ASPIRATION_WINDOW = 25
+
+# 难度档位：Hard 的迭代加深受节点预算约束 (一般在 N=6~8 上每步约 0.3~0.8 秒)，每个节点的
+# 开销随 N 变大，所以大棋盘的预算更小，使不同 N 下每步耗时大致相同。Medium 被
+# TIMED_MAX_DEPTH 限制在 2 层 (每步约 1 毫秒)，它的预算只是上限，实际用不完。
+# 每档: (适用的最大 N，None 表示更大的棋盘, {难度: 节点预算})
+NODE_BUDGETS = [
+    (8, {"Medium": 3000, "Hard": 50000}),
+    (12, {"Medium": 3000, "Hard": 45000}),
+    (16, {"Medium": 2500, "Hard": 40000}),
+    (None, {"Medium": 2000, "Hard": 27000}),
+]
+# 各难度每步思考时间的上限 (秒)，节点预算之外的保险
+PROFILE_TIME_LIMIT = {"Medium": 1.0, "Hard": 3.0}
+# 后台思考 (所有应手合计) 最多使用该难度节点预算的多少倍，用完就停，不会一直加深下去
+PONDER_BUDGET_FACTOR = 20
+
+# 限时模式的时间分配
+TIME_FRACTION = 1 / 3   # 每步最多使用剩余时间的比例
+TIME_MARGIN = 0.5       # 预留给动画和线程切换的安全余量 (秒)
+MIN_TIME_BUDGET = 0.05  # 无论剩余多少时间，至少给搜索这么多秒
+
+
+# 窗口表缓存：{(N, 障碍物集合): 窗口表}，最多保留 WINDOW_CACHE_SIZE 种布局
+WINDOW_CACHE_SIZE = 32
+_WINDOW_CACHE = {}
+
+
+def build_window_table(N, obstacles):
+    """
+    预先计算某个棋盘尺寸 + 障碍物布局下所有可能连成 4 子的窗口。
+    格子用一维下标 r*N+c 表示。含障碍物的窗口永远得 0 分，构建时直接丢弃。
+    :param obstacles: 障碍物坐标集合 {(r,c), ...}
+    :return: 字典
+             - windows: [(i0, i1, i2, i3), ...] 横、竖、斜窗口 (顺序与逐格扫描时相同)
+             - getters: 与 windows 一一对应的 itemgetter，从一维棋盘中一次取出 4 个格子
+             - center: 中间一列所有格子的下标
+             - cell_windows: 反向索引，cell_windows[i] 为经过格子 i 的 [(窗口编号, 该格在窗口编码中的权重), ...]
+    """
+    blocked = {r * N + c for r, c in obstacles}
+    windows = []
+    for r in range(N): # 行
+        for pos in range(N - 3):
+            windows.append(tuple(r * N + pos + k for k in range(4)))
+    for c in range(N): # 列
+        for pos in range(N - 3):
+            windows.append(tuple((pos + k) * N + c for k in range(4)))
+    for i in range(N): # 对角线
+        for j in range(N):
+            if i + 3 <= N - 1 and j + 3 <= N - 1:
+                windows.append(tuple((i + k) * N + j + k for k in range(4)))
+            if i + 3 <= N - 1 and j - 3 >= 0:
+                windows.append(tuple((i + k) * N + j - k for k in range(4)))
+    windows = [w for w in windows if not blocked.intersection(w)]
+    cell_windows = [[] for _ in range(N * N)]
+    for idx, w in enumerate(windows):
+        for k, i in enumerate(w):
+            cell_windows[i].append((idx, 4 ** (WINDOW_LENGTH - 1 - k)))
+    return {
+        "windows": windows,
+        "getters": [itemgetter(*w) for w in windows],
+        "center": tuple(i * N + N // 2 for i in range(N)),
+        "cell_windows": cell_windows,
+    }
+
+
+def encode_window(window):
+    """把 4 个格子按 4 进制编码成 0~255 的整数 (0 空, 1/2 棋子, 3 障碍)，第一个格子是最高位"""
+    code = 0
+    for v in window:
+        code = code * 4 + v
+    return code
+
+
+def get_window_table(N, obstacles):
+    """获取 (N, obstacles) 对应的窗口表，同一布局只构建一次"""
+    key = (N, obstacles)
+    table = _WINDOW_CACHE.get(key)
+    if table is None:
+        if len(_WINDOW_CACHE) >= WINDOW_CACHE_SIZE:
+            _WINDOW_CACHE.clear()
+        table = build_window_table(N, obstacles)
+        _WINDOW_CACHE[key] = table
+    return table
+
+
+def difficulty_profile(difficulty, N):
+    """
+    某个难度在 N x N 棋盘上的搜索档位。
+    :return: {"nodes": 节点预算, "seconds": 思考时间上限, "max_depth": 最大深度 (None 不限)}；
+             Easy 和 MCTS 不使用档位，返回 None
+    """
+    if difficulty not in PROFILE_TIME_LIMIT:
+        return None
+    for max_n, budgets in NODE_BUDGETS:
+        if max_n is None or N <= max_n:
+            return {"nodes": budgets[difficulty], "seconds": PROFILE_TIME_LIMIT[difficulty],
+                    "max_depth": TIMED_MAX_DEPTH[difficulty]}
+
+
+def new_stats(**extra):
+    """
+    一份清零的搜索统计 (AIPlayer.stats)：
+    nodes 访问节点数 (MCTS 为模拟局数)，leaf_evals 叶子估值次数，cutoffs 剪枝次数，
+    tt_hits 置换表命中次数 (表项深度足够、直接用上了结果或边界)，depth 完整搜完的深度，
+    elapsed 用时 (秒)，nps 每秒节点数
+    :param extra: 额外的统计项
+    """
+    stats = {"nodes": 0, "leaf_evals": 0, "cutoffs": 0, "tt_hits": 0, "depth": 0, "elapsed": 0.0, "nps": 0.0}
+    stats.update(extra)
+    return stats
+
+
+class IncrementalEvaluator:
+    """
+    增量估值器：跟随搜索中的落子/悔棋维护整盘分数，结果与 AIPlayer.score_position 完全相同。
+    每个窗口维护它的 4 进制编码，落子只需给经过该格子的窗口 (最多 16 个) 加上
+    player * 权重，再查 AIPlayer.pattern_scores 表更新分数；中间一列变化时重算中心分。
+    """
+
+    def __init__(self, ai, match_obj, piece):
+        """
+        :param ai: AIPlayer，使用它的 pattern_scores 表和 evaluate_window 打分
+        :param match_obj: 搜索的根局面 (Match 或 BitBoard)
+        :param piece: 站在哪一方的视角估值
+        """
+        self.ai = ai
+        self.piece = piece
+        self.N = match_obj.N
+        table = get_window_table(match_obj.N, match_obj.obstacles)
+        self.center = table["center"]
+        self.cell_windows = table["cell_windows"]
+        self.pattern_scores = ai.pattern_scores[piece]
+        self.cells = match_obj.flat_board()
+        self.codes = [encode_window(g(self.cells)) for g in table["getters"]]
+        self.center_score = self._center_score()
+        self.score = sum(self.pattern_scores[code] for code in self.codes) + self.center_score
+
+    def _center_score(self):
+        return self.ai.evaluate_window([self.cells[i] for i in self.center], self.piece) * 2
+
+    def _update(self, i, delta):
+        """格子 i 的值变化了 delta，更新经过它的窗口编码和得分"""
+        codes, scores = self.codes, self.pattern_scores
+        score = self.score
+        for w, weight in self.cell_windows[i]:
+            old = codes[w]
+            new = old + delta * weight
+            codes[w] = new
+            score += scores[new] - scores[old]
+        self.score = score
+        if i % self.N == self.N // 2:
+            new_score = self._center_score()
+            self.score += new_score - self.center_score
+            self.center_score = new_score
+
+    def push(self, pos, player):
+        """落子后调用，pos 为落点 (row, col)"""
+        i = pos[0] * self.N + pos[1]
+        self.cells[i] = player
+        self._update(i, player)
+
+    def pop(self, pos):
+        """悔棋前调用，pos 为将被撤销的落点 (row, col)"""
+        i = pos[0] * self.N + pos[1]
+        player = self.cells[i]
+        self.cells[i] = EMPTY
+        self._update(i, -player)
+
+
+class SearchTimeout(Exception):
+    """搜索时间用完或被取消：在 minimax 内部抛出，由 get_best_move 捕获"""
+    pass
+
+
+class CancelToken:
+    """
+    搜索的取消令牌：由发起搜索的一方创建并传给 get_best_move，
+    任何线程调用 cancel() 后，搜索在下一个节点中止并返回目前为止最好的一步。
+    """
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
 class AIPlayer:
-    def __init__(self, difficulty="Medium"):
+    def __init__(self, difficulty="Medium", use_bitboard=True, tt_size=DEFAULT_TT_SIZE, move_ordering=True,
+                 incremental_eval=True, batch_eval=False, workers=1, shared_tt=True,
+                 endgame_threshold=ENDGAME_EMPTY_THRESHOLD, use_book=True, mcts_playouts=None,
+                 use_profiles=True, search="pvs", threat_prepass=True):
         """
-        :param difficulty: "Easy" (随机), "Medium" (浅层搜索), "Hard" (深层搜索)
+        :param difficulty: "Easy" (随机), "Medium" (浅层搜索), "Hard" (深层搜索),
+                           "MCTS" (蒙特卡洛树搜索，适合分支很多的大棋盘，见 mcts.py)
+        :param use_bitboard: 搜索前把 Match 转换为 BitBoard，节点拷贝只需复制几个整数
+        :param tt_size: 置换表最大条目数，0 表示不使用置换表
+        :param move_ordering: 是否对候选列排序 (置换表最佳列、杀手走法、历史表、中心优先)，
+                              关闭后按从左到右的顺序搜索，用于对比剪枝效果
+        :param incremental_eval: 搜索中用 IncrementalEvaluator 增量维护局面分数，
+                                 关闭后每个叶子都调用 score_position 整盘估值
+        :param batch_eval: 在离叶子只差一层的节点上，用 NumPy 一次性为所有子局面整盘估值
+                           (见 score_children)。没有安装 NumPy 时自动忽略。
+        :param workers: 搜索使用的进程数。大于 1 时根节点的各列分给进程池并行搜索 (见 parallel.py)
+        :param shared_tt: 并行搜索时所有工作进程共用一张共享内存置换表 (总大小仍为 tt_size 条)，
+                          关闭后每个工作进程各自维护一张
+        :param endgame_threshold: Hard 难度下剩余空格数不超过该值时，改用 EndgameSolver 精确求解
+                                  (见 endgame.py)，0 表示不使用
+        :param use_book: Hard 难度下先查开局库 (见 book.py)，命中时不再搜索
+        :param mcts_playouts: MCTS 难度不限时搜索时的模拟局数，None 表示使用 mcts.DEFAULT_PLAYOUTS
+        :param use_profiles: Medium / Hard 按 difficulty_profile 的节点预算搜索，每步耗时与 N 无关；
+                             关闭后恢复按固定深度 (FIXED_DEPTH) 搜索
+        :param search: "pvs" 使用 negamax 形式的主变例搜索 (零窗口试探 + 期望窗口)，
+                       "minimax" 使用原来的 minimax (保留作对照实现)
+        :param threat_prepass: 搜索前先检查直接获胜、必须堵住的点和双重威胁 (见 tactical_move)，
+                               答案唯一时不再搜索
         """
         self.difficulty = difficulty
+        self.use_bitboard = use_bitboard
+        self.move_ordering = move_ordering
+        self.incremental_eval = incremental_eval
+        self.batch_eval = batch_eval and HAS_NUMPY
+        self.workers = workers
+        # 窗口编码 -> 分数的查找表，由 evaluate_window 的规则生成
+        self.pattern_scores = self.build_pattern_table()
+        # 当前搜索使用的增量估值器 (只在 get_best_move 期间存在)
+        self._evaluator = None
+        # 置换表在整局对局中保留 (跨多次 get_best_move)，容量固定
+        if tt_size <= 0:
+            self.tt = None
+        elif workers > 1 and shared_tt:
+            self.tt = SharedTranspositionTable(tt_size)
+        else:
+            self.tt = TranspositionTable(tt_size)
+        # 残局求解器 (只有 Hard 难度使用)，置换表在整局对局中保留
+        self.endgame_threshold = endgame_threshold
+        self.endgame = EndgameSolver() if difficulty == "Hard" and endgame_threshold > 0 else None
+        self.use_book = use_book and difficulty == "Hard"
+        # MCTS 引擎在整局对局中保留搜索树
+        self.mcts = MCTSEngine() if difficulty == "MCTS" else None
+        self.mcts_playouts = mcts_playouts
+        # 限时搜索的截止时间 (time.time())，None 表示不限时
+        self._deadline = None
+        # 当前搜索的取消令牌 (CancelToken)，None 表示不可取消
+        self._cancel = None
+        self.use_profiles = use_profiles
+        self.search = search
+        self.threat_prepass = threat_prepass
+        # 当前搜索的节点预算，None 表示不限
+        self._node_limit = None
+        # 走法排序用的启发信息，每次 get_best_move 重置
+        self.killers = {}        # {ply: [col, col]} 该层最近引起剪枝的两个列
+        self.history_table = {}  # {(mover, row, col): 分数} 引起剪枝的落点累计 depth^2
+        # 后台思考 (ponder)：对手思考时预先搜索对手可能的应手。
+        # ponder_cache: {position_key(对手应手后的局面, piece): (最佳列, 搜索深度)}
+        self.ponder_cache = {}
+        self._ponder_thread = None
+        self._ponder_cancel = None
+        self._ponder_root = None
+        # 迭代加深实际完成的深度 {(N, 是否按档位, 是否限时): 深度}，判断后台思考的结果够不够深
+        self._reached_depth = {}
+        # 搜索统计 (各项见 new_stats)，每次 get_best_move 开始时清零，搜索过程中随时可读；
+        # 残局求解时另有 solve_time (秒) 和 endgame (求解结果 1 胜 / 0 平 / -1 负)，
+        # 求解超时回到普通搜索时另有 endgame_nodes 和 solve_time (nps 把两部分节点一起算)；
+        # 战术预检直接给出答案时另有 tactic ("win" / "block" / "double")；
+        # 命中开局库 / 后台思考缓存时另有 book / ponder；MCTS 另有 mcts.py 中的各项
+        self.stats = new_stats()
+
+    def worker_settings(self):
+        """
+        并行搜索时工作进程用来构造同样设置的 AIPlayer 的参数 (工作进程内部只用单进程搜索)。
+        使用共享置换表时工作进程不需要自己的表。
+        """
+        own_tt = self.tt is not None and not isinstance(self.tt, SharedTranspositionTable)
+        return {
+            "difficulty": self.difficulty,
+            "use_bitboard": self.use_bitboard,
+            "tt_size": self.tt.max_entries if own_tt else 0,
+            "move_ordering": self.move_ordering,
+            "incremental_eval": self.incremental_eval,
+            "batch_eval": self.batch_eval,
+            "search": self.search,
+        }
+
+    @staticmethod
+    def time_budget(time_left):
+        """
+        根据剩余时间计算本步的思考时间 (秒)。
+        留出安全余量，保证 AI 不会超时。
+        :param time_left: 本回合剩余的秒数
+        """
+        budget = min(time_left * TIME_FRACTION, time_left - TIME_MARGIN)
+        return max(MIN_TIME_BUDGET, budget)
 
-    def get_best_move(self, match_obj, piece):
+    def get_best_move(self, match_obj, piece, time_budget=None, cancel=None):
         """
         AI 的主入口函数。
-        :param match_obj: 当前的 Match 对象 (包含棋盘 board, N 等)
+        :param match_obj: 当前的 Match 对象 (包含棋盘 board, N 等)，也可以直接传入 BitBoard
         :param piece: AI 持有的棋子 (通常是 2)
-        :return: 决定落子的列号 (col)
+        :param time_budget: (选填) 思考时间 (秒)。给定时使用迭代加深，
+                            返回最深一轮完整搜索的结果；不给定时按难度固定深度搜索。
+        :param cancel: (选填) CancelToken。被取消时立即停止搜索，返回目前为止最好的一步
+        :return: 决定落子的列号 (col)。本次搜索的统计见 self.stats
         """
+        # 后台思考和正式搜索共用置换表、杀手表、统计等状态，先让后台思考停下
+        self.stop_ponder()
+        start = time.time()
+        self.stats = new_stats()
+        col = self._choose_move(match_obj, piece, time_budget, cancel)
+        elapsed = time.time() - start
+        self.stats["elapsed"] = elapsed
+        nodes = self.stats["nodes"] + self.stats.get("endgame_nodes", 0)
+        self.stats["nps"] = nodes / elapsed if elapsed > 0 else 0.0
+        return col
+
+    def _choose_move(self, match_obj, piece, time_budget, cancel):
+        """get_best_move 的主体：依次尝试各种捷径，最后才做完整搜索"""
+
+        # 搜索会在局面上原地 move/undo_move，先拷贝一份，避免界面线程看到模拟中的棋子
+        if self.use_bitboard and isinstance(match_obj, Match):
+            match_obj = BitBoard.from_match(match_obj)
+        else:
+            match_obj = match_obj.copy()
+
         valid_locations = match_obj.get_valid_locations()
         
         # 没有任何空位，返回 None
@@ -36,22 +370,384 @@ class AIPlayer:
             move = random.choice(valid_locations)
             return move
 
+        # 一步就能赢、必须马上堵、或者能走出双重威胁时，答案是确定的，不需要搜索
+        if self.threat_prepass:
+            tactic = self.tactical_move(match_obj, piece, valid_locations)
+            if tactic is not None:
+                self.stats = new_stats(tactic=tactic[1])
+                return tactic[0]
+
+        # MCTS 难度：限时模式按时间，否则按模拟局数
+        if self.mcts is not None:
+            playouts = self.mcts_playouts if time_budget is None else None
+            col = self.mcts.search(match_obj, piece, time_budget, playouts, cancel)
+            self.stats = new_stats(nodes=self.mcts.stats["playouts"], **self.mcts.stats)
+            return col
+
         # TODO 2: Medium / Hard 难度
         # 使用 Minimax 算法。
         # 如果是 Medium，深度 depth 设为 2。
         # 如果是 Hard，深度 depth 设为 4 (或者根据棋盘大小 N 动态调整，N越小深度可以越大)。
-        elif self.difficulty == 'Medium':
-            depth = 2
-        elif self.difficulty == 'Hard':
-            depth = 4
+        # 限时模式下改用迭代加深，深度由时间决定 (见 iterative_deepening)。
+        depth = FIXED_DEPTH[self.difficulty]
+        # 按难度档位搜索时，思考时间不超过档位的上限
+        profile = difficulty_profile(self.difficulty, match_obj.N) if self.use_profiles else None
+        if profile is not None:
+            time_budget = profile["seconds"] if time_budget is None else min(time_budget, profile["seconds"])
+
+        # 开局库里有这个局面就直接走库里的列
+        if self.use_book:
+            book = get_book(match_obj.N, match_obj.obstacles)
+            if book is not None:
+                key, mirrored = position_key(match_obj, piece)
+                col = self._mirror_col(match_obj, book.probe(key), mirrored)
+                if col in valid_locations:
+                    self.stats = new_stats(book=True)
+                    return col
+
+        # 空格不多时直接精确求解。限时模式下最多用一半时间，求不完再回到普通搜索，
+        # 求解器花掉的节点和时间记入之后的统计 (endgame_nodes / solve_time)
+        solver_extra = {}
+        if self.endgame is not None and match_obj.count_empty() <= self.endgame_threshold:
+            deadline = None
+            if time_budget is not None:
+                deadline = time.time() + time_budget / 2
+            result = self.endgame.solve(match_obj, piece, deadline, cancel)
+            solver_stats = self.endgame.stats
+            if result is not None:
+                self.stats = new_stats(nodes=solver_stats["nodes"], depth=match_obj.count_empty(),
+                                       solve_time=solver_stats["solve_time"], endgame=result[1])
+                return result[0]
+            solver_extra = {"endgame_nodes": solver_stats["nodes"], "solve_time": solver_stats["solve_time"]}
+            if time_budget is not None:
+                time_budget = max(MIN_TIME_BUDGET, time_budget - solver_stats["solve_time"])
+
+        # 对手走了后台思考时预测到的应手 (或它的镜像)：只有当时搜到的深度不低于这次正式搜索
+        # 能达到的深度 (固定深度，或同样设置下上一次迭代加深完成的深度) 才直接使用结果；
+        # 否则照常搜索，后台思考留在置换表中的结果会作为根节点的首选走法和可复用的子树
+        search_mode = (match_obj.N, profile is not None, time_budget is not None)
+        if profile is None and time_budget is None:
+            required_depth = depth
+        else:
+            required_depth = self._reached_depth.get(search_mode)
+        key, mirrored = position_key(match_obj, piece)
+        cached = self.ponder_cache.get(key)
+        if cached is not None:
+            col = self._mirror_col(match_obj, cached[0], mirrored)
+            if col in valid_locations:
+                if required_depth is not None and cached[1] >= required_depth:
+                    self.stats = new_stats(depth=cached[1], ponder=True, **solver_extra)
+                    return col
+                self._seed_root_move(match_obj, piece, col)
+
         # 调用 self.minimax(...) 获取最佳列和分数
-        col, score = self.minimax(match_obj, depth, -10000, 100000, True, piece)
+        if self.tt is not None:
+            self.tt.new_search()
+        self.killers = {}
+        self.history_table = {}
+        self.stats = new_stats(**solver_extra)
+        if self.incremental_eval:
+            self._evaluator = IncrementalEvaluator(self, match_obj, piece)
+        self._cancel = cancel
+        root_len = len(match_obj.history)
+        try:
+            if profile is not None:
+                self._node_limit = profile["nodes"]
+                col = self.iterative_deepening(match_obj, piece, time_budget, profile["max_depth"])
+                self._reached_depth[search_mode] = self.stats["depth"]
+            elif time_budget is not None:
+                col = self.iterative_deepening(match_obj, piece, time_budget, TIMED_MAX_DEPTH[self.difficulty])
+                self._reached_depth[search_mode] = self.stats["depth"]
+            else:
+                col, score = self.search_root(match_obj, depth, piece)
+                self.stats["depth"] = depth
+        except SearchTimeout:
+            # 固定深度搜索被取消：撤销搜索中途的落子，下面取目前最好的一步
+            while len(match_obj.history) > root_len:
+                self._unmake_move(match_obj)
+            col = None
+        finally:
+            self._evaluator = None
+            self._cancel = None
+            self._node_limit = None
         # 注意：minimax 返回的是 (col, score)，这里只需要返回 col
         if col is None:
-            col = random.choice(valid_locations)
+            col = self.fallback_move(match_obj, valid_locations, piece)
             
         return col
-        pass
+
+    def _seed_root_move(self, match_obj, piece, col):
+        """
+        置换表中没有根局面的条目时 (例如后台思考的结果已被覆盖)，写入一条深度为 0 的条目，
+        只提供首选走法：搜索只在深度 >= 1 的节点查表，深度 0 的条目不会被当作分数使用。
+        """
+        if self.tt is None:
+            return
+        tt_key, mirrored = self._tt_key(match_obj, True, piece)
+        if self.tt.probe(tt_key) is None:
+            self.tt.store(tt_key, 0, LOWER, -WIN_SCORE, self._mirror_col(match_obj, col, mirrored))
+
+    def winning_columns(self, match_obj, player, valid_locations=None):
+        """
+        player 落子后立刻连成四子的列 (落点由 get_target_row 的重力规则决定)。
+        :return: 列号列表
+        """
+        if valid_locations is None:
+            valid_locations = match_obj.get_valid_locations()
+        cols = []
+        for col in valid_locations:
+            match_obj.move(col, player)
+            if match_obj.judge(incremental=True)[1] == player:
+                cols.append(col)
+            match_obj.undo_move()
+        return cols
+
+    def tactical_move(self, match_obj, piece, valid_locations=None):
+        """
+        战术预检：只看一两步的强制着法，不做搜索。按顺序检查
+        1. 能直接连成四子的列 -> "win"
+        2. 对手下一步能连成四子的列，堵住它 -> "block"
+           (对手有两个以上这样的列时已经堵不住了，堵哪个都一样)
+        3. 落子后对手没有直接获胜的列、而自己有至少两个直接获胜的列 (双重威胁)，
+           对手只能堵住其中一个 -> "double"
+        :return: (col, 类型)，没有强制着法时返回 None
+        """
+        if valid_locations is None:
+            valid_locations = match_obj.get_valid_locations()
+        opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+        center = (match_obj.N - 1) / 2
+        ordered = sorted(valid_locations, key=lambda c: abs(c - center))
+
+        wins = self.winning_columns(match_obj, piece, ordered)
+        if wins:
+            return wins[0], "win"
+        threats = self.winning_columns(match_obj, opp_piece, ordered)
+        if threats:
+            return threats[0], "block"
+
+        for col in ordered:
+            match_obj.move(col, piece)
+            double = (not self.winning_columns(match_obj, opp_piece)
+                      and len(self.winning_columns(match_obj, piece)) >= 2)
+            match_obj.undo_move()
+            if double:
+                return col, "double"
+        return None
+
+    def fallback_move(self, match_obj, valid_locations, piece):
+        """
+        搜索没有给出结果 (例如第一轮还没搜完就被取消) 时的落子：
+        置换表中记录的根局面最佳列，没有的话取走法排序最靠前的列。
+        """
+        tt_move = None
+        if self.tt is not None:
+            tt_key, mirrored = self._tt_key(match_obj, True, piece)
+            entry = self.tt.probe(tt_key)
+            if entry is not None and self._mirror_col(match_obj, entry[4], mirrored) in valid_locations:
+                tt_move = self._mirror_col(match_obj, entry[4], mirrored)
+        return self.order_moves(match_obj, valid_locations, piece, tt_move)[0]
+
+    def start_ponder(self, match_obj, piece):
+        """
+        轮到对手落子时调用：在后台线程中搜索对手可能的应手，结果存入 ponder_cache。
+        同一局面重复调用不会重新开始。
+        :param match_obj: 当前局面 (轮到对手落子)，会被拷贝，不会被修改
+        :param piece: AI 持有的棋子
+        """
+        if self.difficulty in ("Easy", "MCTS"):
+            return
+        root_key = position_key(match_obj, PLAYER_PIECE if piece == AI_PIECE else AI_PIECE)[0]
+        if root_key == self._ponder_root:
+            return
+        self.stop_ponder()
+        if self.use_bitboard and isinstance(match_obj, Match):
+            match_obj = BitBoard.from_match(match_obj)
+        else:
+            match_obj = match_obj.copy()
+        if not match_obj.get_valid_locations() or match_obj.judge()[0]:
+            return
+        self._ponder_root = root_key
+        self.ponder_cache = {}
+        self._ponder_cancel = CancelToken()
+        self._ponder_thread = threading.Thread(target=self._ponder, args=(match_obj, piece, self._ponder_cancel),
+                                               daemon=True)
+        self._ponder_thread.start()
+
+    def stop_ponder(self):
+        """立即停止后台思考并等待线程退出 (已经搜完的结果保留在 ponder_cache 中)"""
+        thread = self._ponder_thread
+        if thread is None:
+            return
+        # 正在进行的搜索在下一个节点就抛出 SearchTimeout
+        self._ponder_cancel.cancel()
+        thread.join()
+        self._ponder_thread = None
+
+    def is_pondering(self):
+        """后台思考线程是否还在运行 (节点预算用完或搜到最深后会自行结束)"""
+        return self._ponder_thread is not None and self._ponder_thread.is_alive()
+
+    def _ponder(self, match_obj, piece, cancel):
+        """
+        后台思考线程：逐轮加深，每一轮按可能性从高到低搜索对手的每个应手之后的局面。
+        上一次搜索的主变化 (置换表中对手的最佳列) 排在最前面。
+        """
+        opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+        tt_move = None
+        if self.tt is not None:
+            tt_key, mirrored = self._tt_key(match_obj, False, piece)
+            entry = self.tt.probe(tt_key)
+            if entry is not None:
+                tt_move = self._mirror_col(match_obj, entry[4], mirrored)
+            self.tt.new_search()
+        self.killers = {}
+        self.history_table = {}
+        self.stats = new_stats()
+        # 对称局面下互为镜像的应手得到互为镜像的局面，缓存键相同，只需搜一半
+        replies = self.order_moves(match_obj, self.symmetric_moves(match_obj, match_obj.get_valid_locations()),
+                                   opp_piece, tt_move)
+        limit = match_obj.count_empty() - 1
+        if TIMED_MAX_DEPTH[self.difficulty] is not None:
+            limit = min(limit, TIMED_MAX_DEPTH[self.difficulty])
+        root_len = len(match_obj.history)
+
+        self._cancel = cancel
+        self._node_limit = difficulty_profile(self.difficulty, match_obj.N)["nodes"] * PONDER_BUDGET_FACTOR
+        try:
+            for depth in range(1, limit + 1):
+                for col in replies:
+                    if cancel.cancelled:
+                        return
+                    match_obj.move(col, opp_piece)
+                    if not match_obj.judge(incremental=True)[0]:
+                        if self.incremental_eval:
+                            self._evaluator = IncrementalEvaluator(self, match_obj, piece)
+                        best_col, _ = self.search_serial(match_obj, depth, piece)
+                        key, mirrored = position_key(match_obj, piece)
+                        self.ponder_cache[key] = (self._mirror_col(match_obj, best_col, mirrored), depth)
+                        self._evaluator = None
+                    match_obj.undo_move()
+        except SearchTimeout:
+            # 搜索停在树的中间，把模拟的落子全部撤销 (局面是副本，撤销只是为了保持一致)
+            self._evaluator = None
+            while len(match_obj.history) > root_len:
+                match_obj.undo_move()
+        finally:
+            self._evaluator = None
+            self._cancel = None
+            self._node_limit = None
+
+    def search_root(self, match_obj, depth, piece, alpha=None, beta=None):
+        """
+        搜索根局面：workers > 1 时根节点并行，否则直接调用 minimax / pvs。
+        :param alpha, beta: 根节点的搜索窗口，None 表示默认窗口
+        :return: (best_col, value)，value 落在窗口外时只是一个边界
+        """
+        if alpha is None or beta is None:
+            alpha, beta = (-math.inf, math.inf) if self.search == "pvs" else (-10000, 100000)
+        if self.workers > 1:
+            return parallel.parallel_root_search(self, match_obj, piece, depth, alpha, beta,
+                                                 self.workers, self._deadline, self._node_limit)
+        return self.search_serial(match_obj, depth, piece, alpha, beta)
+
+    def search_serial(self, match_obj, depth, piece, alpha=None, beta=None):
+        """在当前进程中搜索根局面 (AI 落子)，按 self.search 选择 pvs 或 minimax"""
+        if self.search == "pvs":
+            if alpha is None or beta is None:
+                alpha, beta = -math.inf, math.inf
+            return self.pvs(match_obj, depth, alpha, beta, piece, piece)
+        if alpha is None or beta is None:
+            alpha, beta = -10000, 100000
+        return self.minimax(match_obj, depth, alpha, beta, True, piece)
+
+    def search_root_child(self, match_obj, col, piece, depth, alpha, beta, deadline=None, node_limit=None):
+        """
+        在根局面的 col 列落子，然后搜索剩下的 depth-1 层 (并行搜索的工作进程调用)。
+        :param match_obj: 根局面 (会被原地修改，调用方应传入副本)
+        :param deadline: 截止时间 (time.time())，None 表示不限时
+        :param node_limit: 这一列最多搜索的节点数，None 表示不限
+        :return: 该列的分数，超时或超出节点预算返回 None
+        """
+        self.killers = {}
+        self.history_table = {}
+        self.stats = new_stats()
+        match_obj.move(col, piece)
+        if self.incremental_eval:
+            self._evaluator = IncrementalEvaluator(self, match_obj, piece)
+        self._deadline = deadline
+        self._node_limit = node_limit
+        try:
+            if self.search == "pvs":
+                opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+                return -self.pvs(match_obj, depth - 1, -beta, -alpha, opp_piece, piece)[1]
+            return self.minimax(match_obj, depth - 1, alpha, beta, False, piece)[1]
+        except SearchTimeout:
+            return None
+        finally:
+            self._deadline = None
+            self._node_limit = None
+            self._evaluator = None
+
+    def iterative_deepening(self, match_obj, piece, time_budget, max_depth=None):
+        """
+        迭代加深搜索：深度 1, 2, 3... 逐轮加深，直到时间或节点预算 (_node_limit) 用完。
+        用完时正在进行的那一轮作废，返回最深一轮完整搜索的最佳列。
+        前几轮的结果留在置换表里，后面更深的搜索可以复用。
+        :param time_budget: 思考时间 (秒)，None 表示只受节点预算限制
+        :param max_depth: 最大深度，None 表示搜到剩余空格数为止
+        :return: 最佳列号，连第一轮都没完成时返回 None
+        """
+        start = time.time()
+        self._deadline = start + time_budget if time_budget is not None else None
+        limit = match_obj.count_empty()
+        if max_depth is not None:
+            limit = min(limit, max_depth)
+        root_len = len(match_obj.history)
+
+        best_col = None
+        score = None
+        try:
+            for depth in range(1, limit + 1):
+                if self.search == "pvs" and score is not None and abs(score) < WIN_SCORE:
+                    # 期望窗口：真实分数通常离上一轮不远，窗口越窄剪枝越多；落到窗口外再用全窗口重搜
+                    low, high = score - ASPIRATION_WINDOW, score + ASPIRATION_WINDOW
+                    col, score = self.search_root(match_obj, depth, piece, low, high)
+                    if score <= low or score >= high:
+                        col, score = self.search_root(match_obj, depth, piece)
+                else:
+                    col, score = self.search_root(match_obj, depth, piece)
+                best_col = col
+                self.stats["depth"] = depth
+                # 已经找到必胜/必败，再加深也不会改变结论
+                if abs(score) >= WIN_SCORE:
+                    break
+                # 下一轮至少比这一轮慢好几倍，剩余时间或节点预算不够一半时不再开始新的一轮
+                if time_budget is not None and time.time() - start > time_budget / 2:
+                    break
+                if self._node_limit is not None and self.stats["nodes"] > self._node_limit / 2:
+                    break
+        except SearchTimeout:
+            # 超时时搜索停在树的中间，把模拟的落子全部撤销
+            while len(match_obj.history) > root_len:
+                self._unmake_move(match_obj)
+        finally:
+            self._deadline = None
+        return best_col
+
+    def build_pattern_table(self):
+        """
+        按 evaluate_window 的打分规则，为所有 4^4 = 256 种窗口编码 (见 encode_window) 预先打分。
+        修改了打分规则或权重后，重新调用本方法并赋给 self.pattern_scores 即可。
+        :return: {piece: [256 个分数]}，每个视角一张表
+        """
+        table = {}
+        for piece in (PLAYER_PIECE, AI_PIECE):
+            scores = []
+            for code in range(4 ** WINDOW_LENGTH):
+                window = [(code >> (2 * (WINDOW_LENGTH - 1 - k))) & 3 for k in range(WINDOW_LENGTH)]
+                scores.append(self.evaluate_window(window, piece))
+            table[piece] = scores
+        return table
 
     def evaluate_window(self, window, piece):
         """
@@ -90,42 +786,188 @@ class AIPlayer:
         计算整个棋盘对于 piece 玩家的分数。
         """
         score = 0
-        board = match_obj.board
-        N = match_obj.N
+        cells = match_obj.flat_board()
+        table = get_window_table(match_obj.N, match_obj.obstacles)
 
         # TODO 1: 中心优先策略
         # 重力棋中，中间的列往往机会更多。
         # 获取中间一列 (column = N//2) 的所有棋子，统计 piece 的数量，乘以一个权重(比如3)，加到 score 里。
-        center = [board[i][N // 2] for i in range(N)]
+        center = [cells[i] for i in table["center"]]
         score += self.evaluate_window(center, piece) * 2
         
 
         # TODO 2: 扫描所有可能的连线窗口 (横、竖、斜)
-        # 类似于 Match.judge() 里的遍历，但这里不判断胜负，而是把切出来的 4个格子 传给 self.evaluate_window()
-        # 将所有窗口的得分累加到 score。
-        windows = []
-        for each in board: # 行
-            for pos in range(N - 3):
-                windows.append([each[j] for j in range(pos, pos+4)])
-        for each in range(len(board)): # 列
-            line = [board[i][each] for i in range(len(board))]
-            for pos in range(N - 3):
-                windows.append([line[j] for j in range(pos, pos+4)])
-        for i in range(N): # 对角线
-            for j in range(N):
-                if i + 3 <= N - 1 and j + 3 <= N - 1:
-                        windows.append([board[i+k][j+k] for k in range(4)])
-                if i+3 <= N - 1 and j-3 >= 0:
-                        windows.append([board[i+k][j-k] for k in range(4)])
-        for each in windows:
-            score += self.evaluate_window(each, piece)
+        # 窗口的格子下标已按 (N, 障碍物布局) 预先算好并缓存 (见 get_window_table)，
+        # 这里只需按下标取出 4 个格子，编码后查 self.pattern_scores 表，将得分累加到 score。
+        scores = self.pattern_scores[piece]
+        for getter in table["getters"]:
+            a, b, c, d = getter(cells)
+            score += scores[(a << 6) | (b << 4) | (c << 2) | d]
         return score
 
+    def score_children(self, match_obj, moves, piece):
+        """
+        为当前局面下的多个候选落子估值，结果与逐个落子后调用 score_position 相同。
+        安装了 NumPy 且开启 batch_eval 时，把所有子棋盘叠成一个数组一次性打分；
+        否则逐个 move -> score_position -> undo_move。
+        :param moves: [(col, player), ...]
+        :return: 与 moves 一一对应的分数列表
+        """
+        if not self.batch_eval:
+            scores = []
+            for col, player in moves:
+                match_obj.move(col, player)
+                scores.append(self.score_position(match_obj, piece))
+                match_obj.undo_move()
+            return scores
+
+        N = match_obj.N
+        cells = match_obj.flat_board()
+        placed = [(match_obj.get_target_row(col), col, player) for col, player in moves]
+        window_scores = score_boards(child_boards(cells, N, placed), self.pattern_scores[piece])
+        center_idx = get_window_table(N, match_obj.obstacles)["center"]
+        scores = []
+        for k, (row, col, player) in enumerate(placed):
+            # 中心列只有 N 个格子，沿用 evaluate_window 的规则逐个计算
+            center = [cells[i] for i in center_idx]
+            if col == N // 2:
+                center[row] = player
+            scores.append(float(window_scores[k]) + self.evaluate_window(center, piece) * 2)
+        return scores
+
+    def _minimax_frontier(self, match_obj, valid_locations, maximizingPlayer, piece):
+        """
+        minimax 在 depth == 1 时的批量版本：先逐个检查子局面是否终局，
+        再把剩下的子局面交给 score_children 一次性估值，最后取最大/最小值。
+        :return: (best_col, value)
+        """
+        opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+        mover = piece if maximizingPlayer else opp_piece
+        values = {}
+        pending = []
+        for col in valid_locations:
+            self._make_move(match_obj, col, mover)
+            self.stats["nodes"] += 1
+            is_terminal, winner = self.is_terminal_node(match_obj)
+            self._unmake_move(match_obj)
+            if not is_terminal:
+                pending.append(col)
+            elif winner == piece:
+                values[col] = WIN_SCORE
+            elif winner != 0:
+                values[col] = -WIN_SCORE
+            else:
+                values[col] = 0
+        if pending:
+            self.stats["leaf_evals"] += len(pending)
+            for col, score in zip(pending, self.score_children(match_obj, [(c, mover) for c in pending], piece)):
+                values[col] = score
+
+        best_col = valid_locations[0]
+        for col in valid_locations:
+            if (values[col] > values[best_col]) if maximizingPlayer else (values[col] < values[best_col]):
+                best_col = col
+        return best_col, values[best_col]
+
     def is_terminal_node(self, match_obj):
         """判断搜索是否应该终止：有人赢了，或者棋盘满了"""
-        is_over, winner, _ = match_obj.judge()
+        # 搜索中每个节点都由上一步落子得到，只需检查经过最后一步的连线
+        is_over, winner, _ = match_obj.judge(incremental=True)
         return is_over, winner
 
+    def _tt_key(self, match_obj, maximizingPlayer, piece):
+        """
+        置换表键：规范哈希 (见 zobrist.canonical_hash) + 轮到谁走 + 站在哪一方的视角估值。
+        :return: (键, 是否取了镜像)。取镜像时表中的列号要用 _mirror_col 翻转
+        """
+        keys = get_zobrist_keys(match_obj.N)
+        opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+        mover = piece if maximizingPlayer else opp_piece
+        h, mirrored = canonical_hash(match_obj) if self.mirror_scores(match_obj) else (match_obj.hash, False)
+        return h ^ keys.to_move[mover] ^ keys.perspective[piece], mirrored
+
+    @staticmethod
+    def _mirror_col(match_obj, col, mirrored):
+        """按规范哈希记录的列号和当前局面的列号互相转换 (取了镜像时左右翻转，翻转两次复原)"""
+        if mirrored and col is not None:
+            return match_obj.N - 1 - col
+        return col
+
+    @staticmethod
+    def mirror_scores(match_obj):
+        """
+        局面和它的镜像估值是否相同：障碍物布局对称，且 N 为奇数。
+        (估值的中心列是 N//2，N 为偶数时它不在正中间，镜像后分数会变，
+        置换表和对称剪枝都不能合并这样的局面；开局库和后台思考缓存只记最佳列，不受影响)
+        """
+        return match_obj.N % 2 == 1 and mirror_symmetric(match_obj.N, match_obj.obstacles)
+
+    @staticmethod
+    def symmetric_moves(match_obj, valid_locations):
+        """
+        局面本身左右对称时，c 列和 N-1-c 列的结果互为镜像、分数相同，只保留左半边 (含中间列)。
+        不对称 (或估值不对称，见 mirror_scores) 时原样返回。
+        """
+        if match_obj.hash != match_obj.mirror_hash or not AIPlayer.mirror_scores(match_obj):
+            return valid_locations
+        return [col for col in valid_locations if col <= match_obj.N - 1 - col]
+
+    def _make_move(self, match_obj, col, player):
+        """搜索中落子，同时更新增量估值器"""
+        match_obj.move(col, player)
+        if self._evaluator is not None:
+            self._evaluator.push(match_obj.last_move, player)
+
+    def _unmake_move(self, match_obj):
+        """搜索中撤销最后一步，同时更新增量估值器"""
+        if self._evaluator is not None:
+            self._evaluator.pop(match_obj.last_move)
+        match_obj.undo_move()
+
+    def order_moves(self, match_obj, valid_locations, mover, tt_move=None):
+        """
+        走法排序：好的走法排在前面，alpha-beta 才能尽早剪枝。
+        优先级：置换表中的最佳列 > 本层杀手走法 > 历史表得分高的落点 > 离中心近的列。
+        :param mover: 即将落子的一方
+        :param tt_move: 置换表记录的该局面最佳列
+        """
+        if not self.move_ordering:
+            return valid_locations
+        center = (match_obj.N - 1) / 2
+        killers = self.killers.get(len(match_obj.history), ())
+        keyed = []
+        for col in valid_locations:
+            if col == tt_move:
+                rank = 0
+            elif col in killers:
+                rank = 1
+            else:
+                rank = 2
+            hist = self.history_table.get((mover, match_obj.get_target_row(col), col), 0)
+            keyed.append((rank, -hist, abs(col - center), col))
+        keyed.sort()
+        return [k[3] for k in keyed]
+
+    def _record_cutoff(self, match_obj, col, mover, depth):
+        """记录引起剪枝的走法：更新本层杀手走法和历史表 (在撤销落子之后调用)"""
+        self.stats["cutoffs"] += 1
+        killers = self.killers.setdefault(len(match_obj.history), [])
+        if col not in killers:
+            killers.insert(0, col)
+            del killers[2:]
+        key = (mover, match_obj.get_target_row(col), col)
+        self.history_table[key] = self.history_table.get(key, 0) + depth * depth
+
+    def _tt_store(self, tt_key, depth, value, best_col, alpha_orig, beta_orig):
+        """按搜索窗口判断边界类型后写入置换表"""
+        if value <= alpha_orig:
+            flag = UPPER
+        elif value >= beta_orig:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(tt_key, depth, flag, value, best_col)
+
     def minimax(self, match_obj, depth, alpha, beta, maximizingPlayer, piece):
         """
         Minimax 算法实现 (带 Alpha-Beta 剪枝)。
@@ -137,6 +979,15 @@ class AIPlayer:
         :param piece: AI 的棋子 ID (例如 2)
         :return: (best_col, value) - 最佳列号和对应的分数
         """
+        # 限时模式：时间用完立即中止整个搜索；被取消时同样中止
+        if self._deadline is not None and time.time() > self._deadline:
+            raise SearchTimeout()
+        if self._cancel is not None and self._cancel.cancelled:
+            raise SearchTimeout()
+        if self._node_limit is not None and self.stats["nodes"] >= self._node_limit:
+            raise SearchTimeout()
+        self.stats["nodes"] += 1
+
         # 1. 获取有效落子位置
         valid_locations = match_obj.get_valid_locations()
         
@@ -145,30 +996,66 @@ class AIPlayer:
         if depth == 0 or is_terminal:
             if is_terminal:
                 if winner == piece:
-                    return (None, 100000000000) # AI 赢 (给个极大值)
+                    return (None, WIN_SCORE) # AI 赢 (给个极大值)
                 elif winner != 0: 
-                    return (None, -100000000000) # 对手赢 (给个极小值)
+                    return (None, -WIN_SCORE) # 对手赢 (给个极小值)
                 else: 
                     return (None, 0) # 平局
             else:
                 # 深度耗尽，返回当前盘面的静态估分
+                self.stats["leaf_evals"] += 1
+                if self._evaluator is not None and self._evaluator.piece == piece:
+                    return (None, self._evaluator.score)
                 return (None, self.score_position(match_obj, piece))
 
+        # 查置换表：同一局面常由不同的落子顺序到达，深度足够时可以直接复用结果
+        alpha_orig, beta_orig = alpha, beta
+        tt_key = None
+        tt_move = None
+        if self.tt is not None:
+            tt_key, tt_mirrored = self._tt_key(match_obj, maximizingPlayer, piece)
+            entry = self.tt.probe(tt_key)
+            if entry is not None:
+                # 深度不够时不能直接用结果，但它记录的最佳列仍然适合先搜
+                tt_move = self._mirror_col(match_obj, entry[4], tt_mirrored)
+            if entry is not None and entry[1] >= depth:
+                self.stats["tt_hits"] += 1
+                flag, tt_value = entry[2], entry[3]
+                if flag == EXACT:
+                    return tt_move, tt_value
+                elif flag == LOWER:
+                    alpha = max(alpha, tt_value)
+                else:
+                    beta = min(beta, tt_value)
+                if alpha >= beta:
+                    return tt_move, tt_value
+
+        opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+        mover = piece if maximizingPlayer else opp_piece
+        valid_locations = self.order_moves(match_obj, valid_locations, mover, tt_move)
+
+        # 离叶子只差一层：所有子局面一次性批量估值
+        if depth == 1 and self.batch_eval:
+            best_col, value = self._minimax_frontier(match_obj, valid_locations, maximizingPlayer, piece)
+            if tt_key is not None:
+                self._tt_store(tt_key, depth, value, self._mirror_col(match_obj, best_col, tt_mirrored),
+                               alpha_orig, beta_orig)
+            return best_col, value
+
         # 3. Maximizing Branch (AI 回合 - 找最大分)
         if maximizingPlayer:
             value = -math.inf
-            best_col = random.choice(valid_locations) # 默认随选一个防止空
+            best_col = valid_locations[0] # 默认取排序后的第一列，防止空
             
             for col in valid_locations:
                 # --- 模拟落子 ---
-                # TODO 1: 创建副本
-                temp_match = match_obj.copy()
-                # TODO 2: 在副本上落子
-                temp_match.move(col, piece)
+                # 直接在当前局面上落子，递归返回后再撤销
+                self._make_move(match_obj, col, piece)
                 
                 # --- 递归调用 ---
                 # 注意：这里 maximizingPlayer 变成 False，传入 alpha 和 beta
-                new_score = self.minimax(temp_match, depth-1, alpha, beta, False, piece)[1]
+                new_score = self.minimax(match_obj, depth-1, alpha, beta, False, piece)[1]
+                self._unmake_move(match_obj)
                 
                 # --- 更新最大值 ---
                 # TODO 3: 
@@ -182,28 +1069,28 @@ class AIPlayer:
                 
                 # TODO 5: 剪枝判断
                 if alpha >= beta:
+                    self._record_cutoff(match_obj, col, piece, depth)
                     break
                 
+            if tt_key is not None:
+                self._tt_store(tt_key, depth, value, self._mirror_col(match_obj, best_col, tt_mirrored),
+                               alpha_orig, beta_orig)
             return best_col, value
 
         # 4. Minimizing Branch (对手回合 - 找最小分)
         else: 
             value = math.inf
-            best_col = random.choice(valid_locations)
-            
-            # 计算对手的棋子ID (如果是1则2，是2则1)
-            opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+            best_col = valid_locations[0]
             
             for col in valid_locations:
                 # --- 模拟落子 ---
-                # TODO 1: 创建副本
-                temp_match = match_obj.copy()
-                # TODO 2: 在副本上落子 
-                temp_match.move(col, opp_piece)
+                # 直接在当前局面上落子，递归返回后再撤销
+                self._make_move(match_obj, col, opp_piece)
                 
                 # --- 递归调用 ---
                 # 注意：这里 maximizingPlayer 变成 True
-                new_score = self.minimax(temp_match, depth-1, alpha, beta, True, piece)[1]
+                new_score = self.minimax(match_obj, depth-1, alpha, beta, True, piece)[1]
+                self._unmake_move(match_obj)
                 
                 # --- 更新最小值 ---
                 # TODO 3:
@@ -217,6 +1104,105 @@ class AIPlayer:
                 
                 # TODO 5: 剪枝判断
                 if beta <= alpha:
+                    self._record_cutoff(match_obj, col, opp_piece, depth)
                     break
                 
-            return best_col, value
\ No newline at end of file
+            if tt_key is not None:
+                self._tt_store(tt_key, depth, value, self._mirror_col(match_obj, best_col, tt_mirrored),
+                               alpha_orig, beta_orig)
+            return best_col, value
+
+    def pvs(self, match_obj, depth, alpha, beta, mover, piece):
+        """
+        主变例搜索 (negamax 形式的 alpha-beta)：分数总是站在 mover (轮到落子的一方) 的角度。
+        排序后的第一个走法用完整窗口搜索，其余走法先用零窗口试探是否比它好，
+        只有试探成功时才用完整窗口重搜。结果与 minimax 相同，但节点更少。
+        置换表中仍按 AI (piece) 的角度存储，与 minimax 共用同一张表。
+
+        :param mover: 轮到落子的一方
+        :param piece: AI 的棋子 ID
+        :return: (best_col, value)，value 站在 mover 的角度
+        """
+        if self._deadline is not None and time.time() > self._deadline:
+            raise SearchTimeout()
+        if self._cancel is not None and self._cancel.cancelled:
+            raise SearchTimeout()
+        if self._node_limit is not None and self.stats["nodes"] >= self._node_limit:
+            raise SearchTimeout()
+        self.stats["nodes"] += 1
+
+        # 上一步落子的一方赢了，对 mover 来说就是输了
+        is_terminal, winner = self.is_terminal_node(match_obj)
+        if is_terminal:
+            return (None, -WIN_SCORE if winner else 0)
+        # AI 角度的分数乘以 sign 得到 mover 角度的分数
+        sign = 1 if mover == piece else -1
+        if depth == 0:
+            self.stats["leaf_evals"] += 1
+            if self._evaluator is not None and self._evaluator.piece == piece:
+                return (None, sign * self._evaluator.score)
+            return (None, sign * self.score_position(match_obj, piece))
+
+        alpha_orig = alpha
+        tt_key = None
+        tt_move = None
+        if self.tt is not None:
+            tt_key, tt_mirrored = self._tt_key(match_obj, mover == piece, piece)
+            entry = self.tt.probe(tt_key)
+            if entry is not None:
+                tt_move = self._mirror_col(match_obj, entry[4], tt_mirrored)
+            if entry is not None and entry[1] >= depth:
+                self.stats["tt_hits"] += 1
+                flag, tt_value = entry[2], sign * entry[3]
+                # 换到对手的角度，上下界互换
+                if sign < 0 and flag != EXACT:
+                    flag = UPPER if flag == LOWER else LOWER
+                if flag == EXACT:
+                    return tt_move, tt_value
+                elif flag == LOWER:
+                    alpha = max(alpha, tt_value)
+                else:
+                    beta = min(beta, tt_value)
+                if alpha >= beta:
+                    return tt_move, tt_value
+
+        opp = PLAYER_PIECE if mover == AI_PIECE else AI_PIECE
+        valid_locations = self.symmetric_moves(match_obj, match_obj.get_valid_locations())
+        valid_locations = self.order_moves(match_obj, valid_locations, mover, tt_move)
+
+        if depth == 1 and self.batch_eval:
+            best_col, value = self._minimax_frontier(match_obj, valid_locations, mover == piece, piece)
+            value *= sign
+        else:
+            value = -math.inf
+            best_col = valid_locations[0]
+            for i, col in enumerate(valid_locations):
+                self._make_move(match_obj, col, mover)
+                if i == 0:
+                    score = -self.pvs(match_obj, depth - 1, -beta, -alpha, opp, piece)[1]
+                else:
+                    # 零窗口试探：只判断这一步能否超过 alpha
+                    score = -self.pvs(match_obj, depth - 1, -alpha - SCORE_GRANULARITY, -alpha, opp, piece)[1]
+                    if alpha < score < beta:
+                        score = -self.pvs(match_obj, depth - 1, -beta, -score, opp, piece)[1]
+                self._unmake_move(match_obj)
+
+                if score > value:
+                    value = score
+                    best_col = col
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    self._record_cutoff(match_obj, col, mover, depth)
+                    break
+
+        if tt_key is not None:
+            if value <= alpha_orig:
+                flag = UPPER
+            elif value >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            if sign < 0 and flag != EXACT:
+                flag = UPPER if flag == LOWER else LOWER
+            self.tt.store(tt_key, depth, flag, sign * value, self._mirror_col(match_obj, best_col, tt_mirrored))
+        return best_col, value
\ No newline at end of file
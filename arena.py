@@ -0,0 +1,180 @@
+# arena.py
+# 无界面的 AI 对战场：用进程池在多核上并行跑大量 AI 对 AI 对局 (没有动画和随机延迟)，
+# 每局结果写成一行 JSON，最后输出胜 / 平 / 负比例及其置信区间，用来检验引擎改动。
+#
+# 用法:
+#     python arena.py --a Hard --b Medium --games 1000 --N 8 --obstacles 3
+#     python arena.py --a Hard --b MCTS --games 200 --N 12 --seconds 0.5 --out hard_vs_mcts.jsonl
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from match import Match
+from ai import AIPlayer
+
+DEFAULT_GAMES = 100
+DEFAULT_OUT = "arena_results.jsonl"
+
+# 置信区间使用的正态分位数 (95%)
+CONFIDENCE_Z = 1.96
+
+
+def make_obstacles(N, count, rng):
+    """
+    与 Match._generate_obstacles 相同的规则 (不放在第 0 行)，但使用给定的随机数生成器。
+    随机到的重复坐标只保留一个，所以障碍物可能少于 count 个。
+    """
+    return sorted({(rng.randint(1, N - 1), rng.randint(0, N - 1)) for _ in range(count)})
+
+
+def play_game(task):
+    """
+    工作进程入口：下完一整局。
+    每两局使用同一个种子 (同样的障碍物布局)，双方交换先后手，抵消先手优势。
+    :param task: {"game", "seed", "N", "obstacles", "a", "b", "seconds"}
+    :return: 这一局的结果 (写入 JSONL 的一行)
+    """
+    game = task["game"]
+    seed = task["seed"] * 100000 + game // 2
+    rng = random.Random(seed)
+    obstacles = make_obstacles(task["N"], task["obstacles"], rng)
+    # Easy 难度用 random 模块随机落子，MCTS 有自己的随机数生成器，都按种子固定下来
+    random.seed(seed)
+    a_player = 1 if game % 2 == 0 else 2
+    engines = {a_player: ("a", task["a"]), 3 - a_player: ("b", task["b"])}
+    ais = {}
+    for player, (_, difficulty) in engines.items():
+        ais[player] = AIPlayer(difficulty)
+        if ais[player].mcts is not None:
+            ais[player].mcts.rng.seed(seed * 2 + player)
+
+    match = Match(task["N"], obstacles=obstacles)
+    think_time = {1: 0.0, 2: 0.0}
+    nodes = {1: 0, 2: 0}
+    player = 1
+    winner = None
+    start = time.time()
+    while winner is None:
+        t = time.time()
+        col = ais[player].get_best_move(match, player, time_budget=task["seconds"])
+        think_time[player] += time.time() - t
+        nodes[player] += ais[player].stats["nodes"]
+        if col is None or not match.move(col, player):
+            # 引擎给出非法着法按输棋处理
+            winner = 3 - player
+            break
+        is_over, result, _ = match.judge(incremental=True)
+        if is_over:
+            winner = result
+        player = 3 - player
+
+    if winner == 0:
+        outcome = "draw"
+    else:
+        outcome = engines[winner][0]
+    return {
+        "game": game,
+        "seed": seed,
+        "N": task["N"],
+        "obstacles": obstacles,
+        "p1": engines[1][1],
+        "p2": engines[2][1],
+        "a_player": a_player,
+        "winner": winner,
+        "result": outcome,
+        "moves": [col for _, col in match.history],
+        "think_time": {"p1": think_time[1], "p2": think_time[2]},
+        "nodes": {"p1": nodes[1], "p2": nodes[2]},
+        "elapsed": time.time() - start,
+    }
+
+
+def wilson_interval(k, n, z=CONFIDENCE_Z):
+    """
+    n 次中出现 k 次的比例的 Wilson 置信区间 (比例接近 0 或 1、样本少时比正态近似可靠)。
+    :return: (下限, 上限)
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = k / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def summarize(results):
+    """
+    汇总结果。
+    :return: {"games", "a", "b", "draw": 各自的局数, "score": A 的得分率 (平局算半分),
+              "intervals": {"a"/"b"/"draw": (下限, 上限)}}
+    """
+    n = len(results)
+    counts = {"a": 0, "b": 0, "draw": 0}
+    for r in results:
+        counts[r["result"]] += 1
+    summary = {"games": n, **counts,
+               "score": (counts["a"] + counts["draw"] / 2) / n if n else 0.0,
+               "intervals": {key: wilson_interval(k, n) for key, k in counts.items()}}
+    return summary
+
+
+def run_arena(a, b, games, N, obstacles, seed, seconds=None, jobs=None, out=DEFAULT_OUT, verbose=True):
+    """
+    用 jobs 个进程并行跑 games 局，每完成一局就追加一行到 out。
+    :param a, b: 双方的难度 (见 AIPlayer)
+    :param seconds: 每步思考时间，None 表示按难度档位
+    :return: 全部结果 (按完成顺序)
+    """
+    jobs = jobs or os.cpu_count() or 1
+    tasks = [{"game": i, "seed": seed, "N": N, "obstacles": obstacles, "a": a, "b": b, "seconds": seconds}
+             for i in range(games)]
+    results = []
+    with open(out, 'a', encoding='utf-8') as f, ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(play_game, task) for task in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            if verbose:
+                s = summarize(results)
+                print(f"\r[{len(results)}/{games}] A {s['a']}  B {s['b']}  draw {s['draw']}", end="", flush=True)
+    if verbose:
+        print()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gravity Connect 4 无界面 AI 对战")
+    parser.add_argument("--a", default="Hard", help="引擎 A 的难度")
+    parser.add_argument("--b", default="Medium", help="引擎 B 的难度")
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES)
+    parser.add_argument("--N", type=int, default=8)
+    parser.add_argument("--obstacles", type=int, default=3, help="每局随机障碍物数量")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=None, help="每步思考时间，默认按难度档位")
+    parser.add_argument("--jobs", type=int, default=None, help="并行进程数，默认为 CPU 核数")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="逐局结果追加写入的 JSONL 文件")
+    args = parser.parse_args()
+    if args.games < 1:
+        parser.error("--games must be at least 1")
+
+    t = time.time()
+    results = run_arena(args.a, args.b, args.games, args.N, args.obstacles, args.seed,
+                        args.seconds, args.jobs, args.out)
+    s = summarize(results)
+    print(f"A={args.a}  B={args.b}  N={args.N}  obstacles={args.obstacles}  "
+          f"{s['games']} games in {time.time() - t:.1f}s")
+    for key, label in (("a", "A wins"), ("b", "B wins"), ("draw", "draws")):
+        low, high = s["intervals"][key]
+        print(f"{label:>7}: {s[key]:>5}  {s[key] / s['games']:6.1%}  (95% CI {low:6.1%} - {high:6.1%})")
+    print(f"  score: {s['score']:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
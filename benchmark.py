@@ -0,0 +1,372 @@
+# benchmark.py
+# AI 引擎基准测试：在固定种子生成的局面上测量搜索速度。
+#
+# 用法:
+#     python benchmark.py parallel --workers 8 --depth 5
+#     python benchmark.py throughput --seconds 2
+#     python benchmark.py verify --depth 4
+#     python benchmark.py suite --out benchmark_baseline.json      # 跑整套基准，保存为基线
+#     python benchmark.py compare --baseline benchmark_baseline.json --threshold 0.1
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+
+from match import Match
+from bitboard import BitBoard
+from ai import AIPlayer
+
+# 固定种子，保证每次运行、每台机器上的测试局面都相同
+BENCH_SEED = 2024
+
+# 基准套件：棋盘大小 x 障碍物密度 (障碍物数 = N*N*密度)，每种布局的局面数
+SUITE_SIZES = (6, 8, 12, 16)
+SUITE_DENSITIES = (0.0, 0.1)
+SUITE_COUNT = 3
+SUITE_DIFFICULTIES = ("Easy", "Medium", "Hard", "MCTS")
+# 每一项至少计时这么多秒，结果取平均
+SUITE_MIN_SECONDS = 0.2
+# 测 minimax 节点速度时的固定深度
+SUITE_DEPTH = 4
+DEFAULT_BASELINE = "benchmark_baseline.json"
+# compare 默认把变慢超过 10% 的项标出来
+DEFAULT_THRESHOLD = 0.10
+# 单位为 "s" 的指标越小越好 (每次调用的平均秒数)，其余 (每秒次数) 越大越好
+LOWER_IS_BETTER = ("s",)
+
+
+def make_positions(N, num_obstacles, count, plies, seed=BENCH_SEED):
+    """
+    生成固定的测试局面：随机放置障碍物，再随机走 plies 步 (跳过已经结束的局面)。
+    :return: Match 对象列表
+    """
+    rng = random.Random(seed * 100000 + N * 1000 + num_obstacles * 10 + plies)
+    positions = []
+    while len(positions) < count:
+        obstacles = set()
+        while len(obstacles) < num_obstacles:
+            obstacles.add((rng.randint(1, N - 1), rng.randint(0, N - 1)))
+        match = Match(N, obstacles=sorted(obstacles))
+        for _ in range(plies):
+            valid = match.get_valid_locations()
+            if not valid or match.judge(incremental=True)[0]:
+                break
+            match.move(rng.choice(valid), len(match.history) % 2 + 1)
+        if not match.judge()[0]:
+            positions.append(match)
+    return positions
+
+
+def bench_parallel(workers, depth, sizes=(8, 10, 12), count=4):
+    """
+    对比串行搜索和根节点并行搜索在同一批局面上的耗时。
+    :return: [{N, serial, parallel, speedup}, ...]
+    """
+    # 先搜一次，让进程池启动，后面计时不包含进程创建的开销
+    AIPlayer("Hard", workers=workers).search_root(BitBoard.from_match(Match(8, obstacles=[])), 2, 2)
+
+    results = []
+    for N in sizes:
+        positions = make_positions(N, N // 2, count, plies=N)
+        serial_time = parallel_time = 0
+        for match in positions:
+            piece = len(match.history) % 2 + 1
+            serial_ai = AIPlayer("Hard")
+            t = time.time()
+            serial_ai.search_root(BitBoard.from_match(match), depth, piece)
+            serial_time += time.time() - t
+
+            parallel_ai = AIPlayer("Hard", workers=workers)
+            t = time.time()
+            parallel_ai.search_root(BitBoard.from_match(match), depth, piece)
+            parallel_time += time.time() - t
+        results.append({"N": N, "serial": serial_time, "parallel": parallel_time,
+                        "speedup": serial_time / parallel_time if parallel_time else 0})
+    return results
+
+
+def bench_throughput(seconds, sizes=(8, 12, 16, 20), count=3):
+    """
+    同样的思考时间下，对比 MCTS 每秒模拟局数和 Hard (迭代加深 alpha-beta) 每秒搜索节点数。
+    :return: [{N, playouts_per_sec, nodes_per_sec}, ...]
+    """
+    results = []
+    for N in sizes:
+        positions = make_positions(N, N // 2, count, plies=N)
+        playouts = nodes = 0
+        mcts_time = minimax_time = 0
+        for match in positions:
+            piece = len(match.history) % 2 + 1
+            mcts_ai = AIPlayer("MCTS", threat_prepass=False)
+            mcts_ai.get_best_move(match, piece, time_budget=seconds)
+            playouts += mcts_ai.stats["playouts"]
+            mcts_time += mcts_ai.stats["elapsed"]
+
+            hard_ai = AIPlayer("Hard", use_book=False, endgame_threshold=0, threat_prepass=False)
+            t = time.time()
+            hard_ai.get_best_move(match, piece, time_budget=seconds)
+            minimax_time += time.time() - t
+            nodes += hard_ai.stats["nodes"]
+        results.append({"N": N, "playouts_per_sec": playouts / mcts_time if mcts_time else 0,
+                        "nodes_per_sec": nodes / minimax_time if minimax_time else 0})
+    return results
+
+
+def verify_search(max_depth, sizes=(6, 7, 8, 9), count=6):
+    """
+    对照检查：同一批局面上，PVS (带置换表、走法排序和对称剪枝) 的根节点分数必须和
+    不带置换表、全窗口的 minimax 完全相同。
+    :return: (检查的局面数, [(N, 局面序号, 深度, minimax 分数, pvs 分数), ...])
+    """
+    checked = 0
+    mismatches = []
+    for N in sizes:
+        # 没有障碍物的局面布局对称，同时检查镜像置换表和对称剪枝
+        for num_obstacles, plies in ((0, 2), (0, N // 2), (N // 3, N // 2), (N // 3, N)):
+            for i, match in enumerate(make_positions(N, num_obstacles, count, plies)):
+                piece = len(match.history) % 2 + 1
+                pvs_ai = AIPlayer("Hard", search="pvs")
+                for depth in range(1, max_depth + 1):
+                    _, expected = AIPlayer("Hard", tt_size=0, move_ordering=False, search="minimax").minimax(
+                        BitBoard.from_match(match), depth, -math.inf, math.inf, True, piece)
+                    # pvs_ai 在各个深度之间保留置换表，顺带检查跨深度复用表项的正确性
+                    _, value = pvs_ai.search_serial(BitBoard.from_match(match), depth, piece)
+                    checked += 1
+                    if value != expected:
+                        mismatches.append((N, i, depth, expected, value))
+    return checked, mismatches
+
+
+def quiet_positions(N, num_obstacles, count, plies):
+    """
+    与 make_positions 相同，但跳过有强制着法 (一步制胜 / 必须堵住 / 双重威胁) 的局面：
+    这些局面上各难度都直接走战术预检的捷径，测不到搜索本身。
+    :return: count 个 Match 对象
+    :raises ValueError: 候选局面 (count 的 10 倍) 中没有足够的安静局面
+    """
+    checker = AIPlayer("Hard")
+    candidates = make_positions(N, num_obstacles, count * 10, plies)
+    quiet = [m for m in candidates if checker.tactical_move(m.copy(), len(m.history) % 2 + 1) is None]
+    if len(quiet) < count:
+        raise ValueError(f"only {len(quiet)} of {len(candidates)} positions at N={N}, "
+                         f"{num_obstacles} obstacles, {plies} plies are quiet; {count} needed")
+    return quiet[:count]
+
+
+def _rate(fn, seconds=SUITE_MIN_SECONDS):
+    """反复调用 fn，至少计时 seconds 秒，返回每秒调用次数"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def _mean_latency(make_ai, positions, seconds=SUITE_MIN_SECONDS):
+    """
+    轮流在各个局面上调用 get_best_move (每次都用 make_ai() 新建的 AI，置换表是冷的)，
+    每个局面至少一次、总计时至少 seconds 秒。
+    :return: 每次调用的平均秒数
+    """
+    calls = 0
+    total = 0.0
+    for k in itertools.count():
+        match = positions[k % len(positions)]
+        piece = len(match.history) % 2 + 1
+        ai = make_ai()
+        # Easy 和 MCTS 的随机选择也按种子固定
+        random.seed(BENCH_SEED)
+        if ai.mcts is not None:
+            ai.mcts.rng.seed(BENCH_SEED)
+        t = time.perf_counter()
+        ai.get_best_move(match, piece)
+        total += time.perf_counter() - t
+        calls += 1
+        if calls >= len(positions) and total >= seconds:
+            return total / calls
+
+
+def run_suite(sizes=SUITE_SIZES, densities=SUITE_DENSITIES, count=SUITE_COUNT, verbose=True):
+    """
+    整套基准：每种布局上测
+    - judge: Match.judge 全盘判胜 (次/秒)
+    - valid_locations: get_valid_locations + 每列 get_target_row (次/秒)
+    - score_position: 整盘估值 (次/秒)
+    - minimax_nps: 固定深度 SUITE_DEPTH 的 minimax 搜索 (节点/秒)
+    - latency_<难度>: 各难度 get_best_move 的平均耗时 (秒，不查开局库)
+    :return: {"指标/布局": {"value": 数值, "unit": 单位}}，布局写作 N8-o6 (N=8，6 个障碍物)
+    """
+    results = {}
+    evaluator = AIPlayer("Hard")
+    for N in sizes:
+        for density in densities:
+            num_obstacles = int(N * N * density)
+            tag = f"N{N}-o{num_obstacles}"
+            positions = quiet_positions(N, num_obstacles, count, plies=N)
+            cycle = itertools.cycle(positions)
+
+            results[f"judge/{tag}"] = {"value": _rate(lambda: next(cycle).judge()), "unit": "ops/s"}
+
+            def valid_locations():
+                match = next(cycle)
+                for col in match.get_valid_locations():
+                    match.get_target_row(col)
+            results[f"valid_locations/{tag}"] = {"value": _rate(valid_locations), "unit": "ops/s"}
+
+            results[f"score_position/{tag}"] = {
+                "value": _rate(lambda: evaluator.score_position(next(cycle), 1)), "unit": "ops/s"}
+
+            nodes = 0
+            elapsed = 0.0
+            for match in positions:
+                ai = AIPlayer("Hard", search="minimax", use_profiles=False, use_book=False,
+                              endgame_threshold=0, threat_prepass=False)
+                t = time.perf_counter()
+                ai.search_root(BitBoard.from_match(match), SUITE_DEPTH, len(match.history) % 2 + 1)
+                elapsed += time.perf_counter() - t
+                nodes += ai.stats["nodes"]
+            results[f"minimax_nps/{tag}"] = {"value": nodes / elapsed if elapsed else 0.0, "unit": "nodes/s"}
+
+            for difficulty in SUITE_DIFFICULTIES:
+                latency = _mean_latency(lambda: AIPlayer(difficulty, use_book=False), positions)
+                results[f"latency_{difficulty.lower()}/{tag}"] = {"value": latency, "unit": "s"}
+            if verbose:
+                print(f"{tag} done", flush=True)
+    return results
+
+
+def save_baseline(results, path=DEFAULT_BASELINE):
+    """把 run_suite 的结果连同运行环境写成 JSON 基线文件"""
+    data = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "machine": platform.machine(), "cpus": os.cpu_count(), "seed": BENCH_SEED,
+                 "time": time.strftime("%Y-%m-%d %H:%M:%S")},
+        "results": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_baseline(path):
+    """读取基线文件，返回 {"meta": ..., "results": ...}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    对比两次 run_suite 的结果。
+    变慢比例：越大越好的指标为 基线/当前 - 1，越小越好的为 当前/基线 - 1，大于 0 表示变慢。
+    基线中有、这次却没有的指标 (当前值为 None)，以及这次的值不大于 0 的指标 (测量失效，
+    变慢比例为 None) 都算超过阈值；基线中没有的新指标 (基线值为 None) 和基线值不大于 0 的
+    指标只列出、不算超过阈值。
+    :return: [(指标, 基线值, 当前值, 单位, 变慢比例, 是否超过阈值), ...]
+    """
+    rows = []
+    for name in sorted(set(baseline) | set(current)):
+        if name not in current:
+            rows.append((name, baseline[name]["value"], None, baseline[name]["unit"], None, True))
+            continue
+        if name not in baseline:
+            rows.append((name, None, current[name]["value"], current[name]["unit"], None, False))
+            continue
+        base, cur, unit = baseline[name]["value"], current[name]["value"], baseline[name]["unit"]
+        if cur <= 0:
+            rows.append((name, base, cur, unit, None, True))
+        elif base <= 0:
+            rows.append((name, base, cur, unit, None, False))
+        else:
+            slowdown = cur / base - 1 if unit in LOWER_IS_BETTER else base / cur - 1
+            rows.append((name, base, cur, unit, slowdown, slowdown > threshold))
+    return rows
+
+
+def _format_row(name, base, cur, unit, slowdown, flagged):
+    """compare 命令输出的一行"""
+    def num(value):
+        return f"{value:>12.6g}" if value is not None else f"{'-':>12}"
+
+    if cur is None:
+        mark = "  MISSING"
+    elif base is None:
+        mark = "  NEW"
+    elif slowdown is None:
+        mark = "  INVALID" if flagged else "  NO BASELINE"
+    else:
+        mark = "  SLOWER" if flagged else ""
+    change = f"{slowdown:+7.1%}" if slowdown is not None else f"{'-':>7}"
+    return f"{name:<28} {num(base)} -> {num(cur)} {unit:<7} {change}{mark}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gravity Connect 4 引擎基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("parallel", help="根节点并行搜索相对串行搜索的加速比")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--depth", type=int, default=5)
+
+    p = sub.add_parser("throughput", help="MCTS 每秒模拟局数与 alpha-beta 每秒节点数")
+    p.add_argument("--seconds", type=float, default=1.0)
+
+    p = sub.add_parser("verify", help="检查 PVS 与参考 minimax 的根节点分数是否一致")
+    p.add_argument("--depth", type=int, default=4)
+
+    p = sub.add_parser("suite", help="跑整套基准并写入 JSON 基线文件")
+    p.add_argument("--out", default=DEFAULT_BASELINE)
+    p.add_argument("--count", type=int, default=SUITE_COUNT, help="每种布局的局面数")
+
+    p = sub.add_parser("compare", help="与基线对比，变慢超过阈值时以非零状态退出")
+    p.add_argument("--baseline", default=DEFAULT_BASELINE)
+    p.add_argument("--current", default=None, help="已有的结果文件，不给时现场跑一遍")
+    p.add_argument("--count", type=int, default=SUITE_COUNT)
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="允许的变慢比例 (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    if args.command == "parallel":
+        print(f"workers={args.workers} depth={args.depth}")
+        for r in bench_parallel(args.workers, args.depth):
+            print(f"N={r['N']:>2}  serial {r['serial']:.3f}s  parallel {r['parallel']:.3f}s  speedup x{r['speedup']:.2f}")
+    elif args.command == "throughput":
+        print(f"seconds={args.seconds}")
+        for r in bench_throughput(args.seconds):
+            print(f"N={r['N']:>2}  MCTS {r['playouts_per_sec']:.0f} playouts/s  minimax {r['nodes_per_sec']:.0f} nodes/s")
+    elif args.command == "verify":
+        checked, mismatches = verify_search(args.depth)
+        for N, i, depth, expected, value in mismatches:
+            print(f"MISMATCH N={N} position={i} depth={depth}  minimax {expected}  pvs {value}")
+        print(f"{checked} searches, {len(mismatches)} mismatches")
+        if mismatches:
+            sys.exit(1)
+    elif args.command == "suite":
+        results = run_suite(count=args.count)
+        for name, r in sorted(results.items()):
+            print(f"{name:<28} {r['value']:>14.6g} {r['unit']}")
+        print(f"saved to {save_baseline(results, args.out)}")
+    elif args.command == "compare":
+        baseline = load_baseline(args.baseline)
+        if args.current is not None:
+            current = load_baseline(args.current)["results"]
+        else:
+            current = run_suite(count=args.count)
+        print(f"baseline: {baseline['meta'].get('time')}  {baseline['meta'].get('platform')}")
+        rows = compare_results(baseline["results"], current, args.threshold)
+        for row in rows:
+            print(_format_row(*row))
+        flagged = [row for row in rows if row[5]]
+        print(f"{len(rows)} metrics, {len(flagged)} flagged (slower than {args.threshold:.0%}, missing or invalid)")
+        if flagged:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+from match import Match
+from zobrist import get_zobrist_keys
+
+# 棋子编号，与 Match 保持一致
+EMPTY = 0
+BLOCK = 3
+
+
+def winning_cells(mask, H):
+    """
+    mask 一方再落一子就能连成四子的所有格子 (位布局与 BitBoard 相同，列高 H = N+1)。
+    结果可能包含已被占用的格子和哨兵位，调用方需要和空格 / 可落子位取交集。
+    """
+    # 竖直方向只可能是下面三个连着
+    r = (mask << 1) & (mask << 2) & (mask << 3)
+    for d in (H, H - 1, H + 1):
+        t = (mask << d) & (mask << 2 * d)
+        r |= t & (mask << 3 * d)
+        r |= t & (mask >> d)
+        t = (mask >> d) & (mask >> 2 * d)
+        r |= t & (mask << d)
+        r |= t & (mask >> 3 * d)
+    return r
+
+
+class BitBoard:
+    """
+    位棋盘：与 Match 等价的紧凑局面表示，专供 AI 搜索使用。
+
+    布局：按列存储，每列占 N+1 位 (最高一位是哨兵，永远为 0，防止移位时跨列)。
+    第 col 列、自底向上第 h 格 (h=0 为最底行) 对应的位下标为 col*(N+1) + h，
+    换算成 Match 的行号即 row = N-1-h。
+
+    - self.masks[1] / self.masks[2]: 两位玩家的棋子
+    - self.obstacle_mask: 障碍物
+    - self.heights[col]: 该列下一个可落子的自底向上下标 (== N 表示已满)
+    - self.hash: Zobrist 哈希，与相同局面的 Match.hash 相等
+    - self.mirror_hash: 左右镜像后的局面的哈希，与 Match.mirror_hash 相等
+    - self.obstacles: 障碍物坐标集合 (与 Match.obstacles 相同)
+    """
+
+    def __init__(self, N: int, obstacles=None):
+        """
+        :param N: 棋盘大小 (N x N)
+        :param obstacles: (选填) 障碍物坐标列表 [(r,c), ...]，坐标与 Match 相同
+        """
+        self.N = N
+        self.H = N + 1
+        self.masks = [0, 0, 0]
+        self.obstacle_mask = 0
+        self.heights = [0] * N
+        self.last_move = None
+        self.history = []
+        self._undo_stack = []  # [(col, 上一步的 last_move), ...]
+        self._zobrist = get_zobrist_keys(N)
+        self.hash = 0
+        self.mirror_hash = 0
+        self.obstacles = frozenset((r, c) for r, c in (obstacles or []))
+
+        for r, c in self.obstacles:
+            h = N - 1 - r
+            bit = 1 << (c * self.H + h)
+            self.hash ^= self._zobrist.cells[BLOCK][r * N + c]
+            self.mirror_hash ^= self._zobrist.cells[BLOCK][r * N + N - 1 - c]
+            self.obstacle_mask |= bit
+            # 障碍物下方的空格永远落不到，高度直接越过障碍物
+            self.heights[c] = max(self.heights[c], h + 1)
+
+    @staticmethod
+    def from_match(match):
+        """从 Match 对象构造等价的位棋盘 (读取 board、history、last_move)"""
+        N = match.N
+        bb = BitBoard(N)
+        for r in range(N):
+            h = N - 1 - r
+            for c in range(N):
+                v = match.board[r][c]
+                if v == EMPTY:
+                    continue
+                bit = 1 << (c * bb.H + h)
+                if v == BLOCK:
+                    bb.obstacle_mask |= bit
+                else:
+                    bb.masks[v] |= bit
+                bb.heights[c] = max(bb.heights[c], h + 1)
+        bb.last_move = match.last_move
+        bb.history = list(match.history)
+        bb.hash = bb._zobrist.hash_board(match.board)
+        bb.mirror_hash = bb._zobrist.hash_board(match.board, mirror=True)
+        bb.obstacles = frozenset((r, c) for r in range(N) for c in range(N) if match.board[r][c] == BLOCK)
+        return bb
+
+    def to_match(self):
+        """转换回 Match 对象 (用于界面显示或存档)"""
+        match = Match(self.N, self.board)
+        match.history = list(self.history)
+        match.last_move = self.last_move
+        return match
+
+    def __getstate__(self):
+        # Zobrist 键按 N 缓存在每个进程里，不需要随对象一起序列化 (多进程搜索时传递局面)
+        state = self.__dict__.copy()
+        del state['_zobrist']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._zobrist = get_zobrist_keys(self.N)
+
+    def copy(self):
+        """拷贝当前局面，只需复制几个整数和短列表"""
+        new_bb = BitBoard.__new__(BitBoard)
+        new_bb.N = self.N
+        new_bb.H = self.H
+        new_bb.masks = list(self.masks)
+        new_bb.obstacle_mask = self.obstacle_mask
+        new_bb.heights = list(self.heights)
+        new_bb.last_move = self.last_move
+        new_bb.history = list(self.history)
+        new_bb._undo_stack = list(self._undo_stack)
+        new_bb._zobrist = self._zobrist
+        new_bb.hash = self.hash
+        new_bb.mirror_hash = self.mirror_hash
+        new_bb.obstacles = self.obstacles
+        return new_bb
+
+    @property
+    def board(self):
+        """展开成与 Match.board 相同格式的二维列表 (0 空, 1/2 棋子, 3 障碍)"""
+        N, H = self.N, self.H
+        p1, p2, obs = self.masks[1], self.masks[2], self.obstacle_mask
+        board = [[EMPTY] * N for _ in range(N)]
+        for c in range(N):
+            for h in range(self.heights[c]):
+                bit = 1 << (c * H + h)
+                if p1 & bit:
+                    board[N - 1 - h][c] = 1
+                elif p2 & bit:
+                    board[N - 1 - h][c] = 2
+                elif obs & bit:
+                    board[N - 1 - h][c] = BLOCK
+        return board
+
+    def flat_board(self):
+        """按行展开成一维列表，格子 (r,c) 的下标为 r*N+c (供 AI 估值使用)"""
+        N, H = self.N, self.H
+        p1, p2, obs = self.masks[1], self.masks[2], self.obstacle_mask
+        cells = [EMPTY] * (N * N)
+        for c in range(N):
+            base = c * H
+            for h in range(self.heights[c]):
+                bit = 1 << (base + h)
+                if p1 & bit:
+                    cells[(N - 1 - h) * N + c] = 1
+                elif p2 & bit:
+                    cells[(N - 1 - h) * N + c] = 2
+                elif obs & bit:
+                    cells[(N - 1 - h) * N + c] = BLOCK
+        return cells
+
+    def get_valid_locations(self):
+        """返回当前所有可以落子的列号列表"""
+        N = self.N
+        return [c for c in range(N) if self.heights[c] < N]
+
+    def count_empty(self):
+        """还能落子的空格总数 (被障碍物挡住、永远落不到的格子不算)"""
+        return sum(self.N - h for h in self.heights)
+
+    def get_target_row(self, col: int):
+        """
+        计算在 col 列落子后棋子所在的行号 (Match 坐标)。
+        :return: 目标行号。如果该列已满或越界，返回 -1。
+        """
+        if not (0 <= col < self.N):
+            return -1
+        h = self.heights[col]
+        if h >= self.N:
+            return -1
+        return self.N - 1 - h
+
+    def move(self, col: int, player: int):
+        """执行落子操作，成功返回 True，否则返回 False"""
+        if not (0 <= col < self.N):
+            return False
+        h = self.heights[col]
+        if h >= self.N:
+            return False
+        self.masks[player] |= 1 << (col * self.H + h)
+        self.heights[col] = h + 1
+        self._undo_stack.append((col, self.last_move))
+        row = self.N - 1 - h
+        self.hash ^= self._zobrist.cells[player][row * self.N + col]
+        self.mirror_hash ^= self._zobrist.cells[player][row * self.N + self.N - 1 - col]
+        self.last_move = (row, col)
+        self.history.append((player, col))
+        return True
+
+    def undo_move(self):
+        """撤销最后一步落子，成功返回 True，没有可撤销的步数返回 False"""
+        if not self._undo_stack:
+            return False
+        col, prev_last_move = self._undo_stack.pop()
+        player = self.history.pop()[0]
+        h = self.heights[col] - 1
+        self.masks[player] &= ~(1 << (col * self.H + h))
+        self.heights[col] = h
+        self.hash ^= self._zobrist.cells[player][(self.N - 1 - h) * self.N + col]
+        self.mirror_hash ^= self._zobrist.cells[player][(self.N - 1 - h) * self.N + self.N - 1 - col]
+        self.last_move = prev_last_move
+        return True
+
+    def _find_four(self, mask):
+        """
+        用移位与运算寻找四连。
+        方向位移：竖直 1，水平 H，两条对角线 H+1 / H-1。
+        :return: 四连中最低位的下标和方向位移 (bit, d)，没有四连返回 None
+        """
+        for d in (1, self.H, self.H + 1, self.H - 1):
+            m = mask & (mask >> d)
+            m &= m >> (2 * d)
+            if m:
+                return ((m & -m).bit_length() - 1, d)
+        return None
+
+    def judge(self, incremental=False):
+        """
+        判断游戏胜负，返回值与 Match.judge 相同。
+        :param incremental: 只检查最后落子一方的棋子 (见 Match.judge)
+        :return: (is_over, winner, win_positions)
+        """
+        N, H = self.N, self.H
+        if incremental and self.history:
+            players = (self.history[-1][0],)
+        else:
+            players = (1, 2)
+        for player in players:
+            found = self._find_four(self.masks[player])
+            if found:
+                bit, d = found
+                win_positions = []
+                for k in range(4):
+                    idx = bit + k * d
+                    win_positions.append((N - 1 - idx % H, idx // H))
+                return (True, player, win_positions)
+
+        # 所有列都已满，且前面没人赢，则平局
+        if min(self.heights) >= N:
+            return (True, 0, None)
+
+        return (False, None, None)
@@ -0,0 +1,220 @@
+# book.py
+# 开局库：离线对开局局面做深度搜索，把 (局面哈希, 最佳列) 写成紧凑的二进制文件，
+# 对局时通过 mmap 直接在文件上二分查找，不需要把整个库读进内存。
+#
+# 用法:
+#     python book.py build --N 8 --plies 2 --seconds 2     # 无障碍物的 8x8 棋盘
+#     python book.py build --from-reviews --plies 2        # 回放中出现过的棋盘大小和障碍物布局
+import argparse
+import mmap
+import os
+import struct
+
+from bitboard import BitBoard
+from zobrist import get_zobrist_keys, canonical_hash
+
+BOOKS_DIR = "./books"
+
+# 文件格式：表头 (魔数, 版本, N, 保留, 条目数)，之后是按哈希升序排列的条目 (64 位键, 列号)。
+# 版本 2 起键使用规范哈希，布局对称时互为镜像的局面只存一条 (列号按规范朝向记录)
+BOOK_MAGIC = b"GC4B"
+BOOK_VERSION = 2
+_HEADER = struct.Struct('<4sBBHI')
+_RECORD = struct.Struct('<QB')
+
+# 默认只收录前几步的局面，每个局面搜索的秒数
+DEFAULT_BOOK_PLIES = 2
+DEFAULT_BOOK_SECONDS = 2.0
+
+# 已打开的开局库 {(N, 障碍物): OpeningBook 或 None (文件不存在)}
+_BOOK_CACHE = {}
+
+
+def layout_hash(N, obstacles):
+    """障碍物布局的哈希 (空棋盘只放障碍物时的 Zobrist 哈希)，用于区分不同布局的库文件"""
+    return BitBoard(N, obstacles).hash
+
+
+def book_path(N, obstacles):
+    """某个棋盘大小和障碍物布局对应的库文件路径"""
+    return os.path.join(BOOKS_DIR, f"book_{N}_{layout_hash(N, obstacles):016x}.bin")
+
+
+def position_key(match_obj, player):
+    """
+    开局库 (以及 AI 后台思考缓存) 的键：规范哈希 + 轮到谁走。
+    :return: (键, 是否取了镜像)。取镜像时，按这个键记录的列号要左右翻转 (N-1-col)
+    """
+    h, mirrored = canonical_hash(match_obj)
+    return h ^ get_zobrist_keys(match_obj.N).to_move[player], mirrored
+
+
+class OpeningBook:
+    """只读的开局库文件，用 mmap 映射后二分查找"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.N, _, self.count = _HEADER.unpack_from(self._mm, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self._mm.close()
+            raise ValueError(f"不是有效的开局库文件: {path}")
+
+    def probe(self, key):
+        """
+        查找局面。
+        :return: 最佳列号 (规范朝向)，未收录返回 None
+        """
+        mm = self._mm
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k, col = _RECORD.unpack_from(mm, _HEADER.size + mid * _RECORD.size)
+            if k == key:
+                return col
+            if k < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def get_book(N, obstacles):
+    """
+    获取某个布局的开局库 (按布局缓存，每个布局只检查一次文件)。
+    :return: OpeningBook，没有对应的库文件时返回 None
+    """
+    cache_key = (N, frozenset(obstacles))
+    if cache_key not in _BOOK_CACHE:
+        path = book_path(N, obstacles)
+        book = None
+        if os.path.exists(path):
+            try:
+                book = OpeningBook(path)
+            except (OSError, ValueError):
+                book = None
+        _BOOK_CACHE[cache_key] = book
+    return _BOOK_CACHE[cache_key]
+
+
+def write_book(N, obstacles, entries):
+    """
+    把 {键: 列号} 写成库文件。
+    :param entries: {position_key 的键: 规范朝向的列号}
+    :return: 库文件路径
+    """
+    # 已经打开的旧文件先关闭映射，下次查询时重新打开
+    old = _BOOK_CACHE.pop((N, frozenset(obstacles)), None)
+    if old is not None:
+        old.close()
+    path = book_path(N, obstacles)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    items = sorted(entries.items())
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, N, 0, len(items)))
+        for key, col in items:
+            f.write(_RECORD.pack(key, col))
+    return path
+
+
+def opening_positions(N, obstacles, plies):
+    """
+    枚举从空棋盘 (只有障碍物) 开始、走 plies 步以内能到达的所有未结束局面
+    (同一局面只保留一次，布局对称时互为镜像的局面也只保留一个)。
+    先手为玩家 1。
+    :return: [(BitBoard, 轮到谁走), ...]
+    """
+    root = BitBoard(N, obstacles)
+    positions = []
+    seen = set()
+    frontier = [root]
+    for ply in range(plies + 1):
+        player = ply % 2 + 1
+        next_frontier = []
+        for bb in frontier:
+            h = canonical_hash(bb)[0]
+            if h in seen:
+                continue
+            seen.add(h)
+            positions.append((bb, player))
+            if ply == plies:
+                continue
+            for col in bb.get_valid_locations():
+                child = bb.copy()
+                child.move(col, player)
+                if not child.judge(incremental=True)[0]:
+                    next_frontier.append(child)
+        frontier = next_frontier
+    return positions
+
+
+def build_book(N, obstacles=(), plies=DEFAULT_BOOK_PLIES, seconds=DEFAULT_BOOK_SECONDS, verbose=True):
+    """
+    为一个棋盘布局生成开局库：对每个开局局面用 Hard 难度迭代加深搜索 seconds 秒。
+    :return: 库文件路径
+    """
+    from ai import AIPlayer
+
+    ai = AIPlayer("Hard", use_book=False)
+    positions = opening_positions(N, obstacles, plies)
+    entries = {}
+    for i, (bb, player) in enumerate(positions):
+        col = ai.get_best_move(bb, player, time_budget=seconds)
+        if col is not None:
+            key, mirrored = position_key(bb, player)
+            entries[key] = bb.N - 1 - col if mirrored else col
+        if verbose:
+            print(f"\r[{i + 1}/{len(positions)}] N={N} obstacles={len(obstacles)}", end="", flush=True)
+    if verbose:
+        print()
+    return write_book(N, obstacles, entries)
+
+
+def review_layouts():
+    """回放记录中出现过的 (N, 障碍物) 布局，去重"""
+    import storage
+
+    layouts = {}
+    for info in storage.list_reviews():
+        try:
+            data = storage.load_review(info['filename'])
+            N = data['N']
+            obstacles = tuple(sorted((r, c) for r, c in data.get('obstacles', [])))
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+        layouts[(N, obstacles)] = None
+    return list(layouts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成 Gravity Connect 4 开局库")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="搜索开局局面并写入库文件")
+    p.add_argument("--N", type=int, action="append", help="无障碍物棋盘的大小，可重复给出")
+    p.add_argument("--from-reviews", action="store_true", help="同时为回放中出现过的障碍物布局生成")
+    p.add_argument("--plies", type=int, default=DEFAULT_BOOK_PLIES)
+    p.add_argument("--seconds", type=float, default=DEFAULT_BOOK_SECONDS)
+    args = parser.parse_args()
+
+    layouts = [(N, ()) for N in (args.N or [])]
+    if args.from_reviews:
+        layouts += [layout for layout in review_layouts() if layout not in layouts]
+    if not layouts:
+        parser.error("需要 --N 或 --from-reviews")
+    for N, obstacles in layouts:
+        path = build_book(N, obstacles, args.plies, args.seconds)
+        print(f"{path}: {len(get_book(N, obstacles))} 个局面")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# endgame.py
+# 残局精确求解：空格不多时直接把棋下完，得到确定的胜 / 平 / 负，不再依赖估值函数。
+import time
+
+from bitboard import BitBoard, winning_cells
+
+# 剩余空格数不超过该值时切换到残局求解
+ENDGAME_EMPTY_THRESHOLD = 16
+
+# 求解结果 (站在轮到落子一方的角度)
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# 置换表条目的边界类型 (与 transposition.py 含义相同)
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# 置换表最多条目数，超过后整体清空
+ENDGAME_TT_SIZE = 1 << 20
+
+# 每搜索这么多个节点检查一次是否超时
+CHECK_INTERVAL = 1024
+
+
+class EndgameTimeout(Exception):
+    """求解超过截止时间或被取消"""
+    pass
+
+
+class EndgameSolver:
+    """
+    胜 / 平 / 负 三值的 negamax 精确求解器，直接在位棋盘的整数上运算。
+
+    - cur / opp: 轮到落子一方和对手的棋子位 (布局与 BitBoard 相同)
+    - playable: 每列下一个可落子格子的位，落子后该列上移一格
+    - 置换表键 cur | (cur|opp) << shift 在同一障碍物布局下唯一，不会冲突；
+      值是一个小整数 flag << 2 | (value + 1)
+    走法排序：能直接赢就赢；对手有一个必堵点就只走那里；
+    不走对手必胜格正下方的格子；其余按新增的必胜格数量、离中心的距离排序。
+    """
+
+    def __init__(self, max_entries=ENDGAME_TT_SIZE):
+        """
+        :param max_entries: 置换表最多条目数
+        """
+        self.max_entries = max_entries
+        self.table = {}
+        self._layout = None
+        self.stats = {"nodes": 0, "solve_time": 0.0}
+        self._deadline = None
+        self._cancel = None
+
+    def _setup(self, bb):
+        """按棋盘大小和障碍物布局准备掩码；布局变了就清空置换表"""
+        layout = (bb.N, bb.obstacle_mask)
+        if layout != self._layout:
+            self._layout = layout
+            self.table = {}
+        N, H = bb.N, bb.H
+        self.N, self.H = N, H
+        self.shift = N * H
+        self.board_mask = 0
+        self.col_rank = {}
+        center = (N - 1) / 2
+        for c in range(N):
+            self.board_mask |= ((1 << N) - 1) << (c * H)
+            self.col_rank[c] = abs(c - center)
+
+    def solve(self, match_obj, player, deadline=None, cancel=None):
+        """
+        求解当前局面。
+        :param match_obj: Match 或 BitBoard (不会被修改)
+        :param player: 轮到落子的一方
+        :param deadline: 截止时间 (time.time())，None 表示不限时
+        :param cancel: (选填) 取消令牌，cancelled 为真时停止求解
+        :return: (best_col, result)，result 为 WIN / DRAW / LOSS；超时或被取消返回 None
+        """
+        bb = match_obj if isinstance(match_obj, BitBoard) else BitBoard.from_match(match_obj)
+        self._setup(bb)
+        self._deadline = deadline
+        self._cancel = cancel
+        self.stats = {"nodes": 0, "solve_time": 0.0}
+        start = time.time()
+
+        H = self.H
+        cur, opp = bb.masks[player], bb.masks[3 - player]
+        playable = 0
+        # 还能落到的格子：每列当前高度以上 (障碍物下方的空格永远落不到，不计入)
+        self.reach = 0
+        for c in range(self.N):
+            if bb.heights[c] < self.N:
+                playable |= 1 << (c * H + bb.heights[c])
+                self.reach |= ((1 << (self.N - bb.heights[c])) - 1) << (c * H + bb.heights[c])
+        if not playable:
+            return None
+
+        win = winning_cells(cur, self.H) & playable
+        if win:
+            self.stats["solve_time"] = time.time() - start
+            return ((win & -win).bit_length() - 1) // H, WIN
+
+        try:
+            best_col, best = None, LOSS - 1
+            for b in self._ordered_moves(cur, opp, playable, root=True):
+                col = (b.bit_length() - 1) // H
+                v = -self._negamax(opp, cur | b, self._play(playable, b), -WIN, -max(best, LOSS))
+                if v > best:
+                    best_col, best = col, v
+                if best == WIN:
+                    break
+        except EndgameTimeout:
+            return None
+        finally:
+            self.stats["solve_time"] = time.time() - start
+            self._deadline = None
+            self._cancel = None
+        return best_col, best
+
+    def _play(self, playable, b):
+        """在 b 落子后的可落子位：该列上移一格 (到顶则该列不再可落)"""
+        return (playable ^ b) | ((b << 1) & self.board_mask)
+
+    def _ordered_moves(self, cur, opp, playable, root=False):
+        """
+        候选走法 (单个位) 排序后的列表。
+        非根节点只返回不会立刻输掉的走法；根节点即使全输也要给出一步棋。
+        """
+        empty = self.reach & ~(cur | opp)
+        opp_win = winning_cells(opp, self.H) & empty
+        forced = opp_win & playable
+        safe = playable & ~(opp_win >> 1)
+        if forced:
+            safe &= forced
+        if not safe and root:
+            safe = forced or playable
+
+        moves = []
+        H = self.H
+        while safe:
+            b = safe & -safe
+            safe ^= b
+            threats = bin(winning_cells(cur | b, self.H) & empty & ~b).count("1")
+            moves.append((-threats, self.col_rank[(b.bit_length() - 1) // H], b))
+        moves.sort()
+        return [m[2] for m in moves]
+
+    def _negamax(self, cur, opp, playable, alpha, beta):
+        """
+        :return: 轮到落子一方 (cur) 的结果 WIN / DRAW / LOSS
+        """
+        stats = self.stats
+        stats["nodes"] += 1
+        if stats["nodes"] % CHECK_INTERVAL == 0:
+            if self._deadline is not None and time.time() > self._deadline:
+                raise EndgameTimeout()
+            if self._cancel is not None and self._cancel.cancelled:
+                raise EndgameTimeout()
+
+        # 棋盘下满且没人赢：平局
+        if not playable:
+            return DRAW
+        # 能直接赢
+        if winning_cells(cur, self.H) & playable:
+            return WIN
+
+        empty = self.reach & ~(cur | opp)
+        opp_win = winning_cells(opp, self.H) & empty
+        forced = opp_win & playable
+        # 对手有两个以上的必胜点，堵不过来
+        if forced & (forced - 1):
+            return LOSS
+
+        key = cur | ((cur | opp) << self.shift)
+        code = self.table.get(key)
+        if code is not None:
+            value, flag = (code & 3) - 1, code >> 2
+            if flag == EXACT:
+                return value
+            if flag == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+        moves = self._ordered_moves(cur, opp, playable)
+        if not moves:
+            return LOSS
+
+        alpha_orig = alpha
+        best = LOSS
+        for b in moves:
+            v = -self._negamax(opp, cur | b, self._play(playable, b), -beta, -alpha)
+            if v > best:
+                best = v
+                if best > alpha:
+                    alpha = best
+                    if alpha >= beta:
+                        break
+
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if len(self.table) >= self.max_entries:
+            self.table.clear()
+        self.table[key] = flag << 2 | (best + 1)
+        return best
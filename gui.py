@@ -1,5 +1,6 @@
 # gui.py
 import pygame
+import os
 import sys
 import time
 import threading
@@ -7,7 +8,7 @@ import random
 import re
 # 引入核心模块
 from match import Match
-from ai import AIPlayer
+from ai import AIPlayer, CancelToken
 import storage
 import network
 
@@ -17,6 +18,12 @@ WINDOW_HEIGHT = 800
 FPS = 60
 MIN_WIDTH = 800
 MIN_HEIGHT = 600
+# AI 搜索使用的进程数 (留一个核给界面线程)。只有 Hard 使用多进程：Easy / MCTS 不做 alpha-beta 搜索，
+# Medium 只搜 2 层 (约 1 毫秒)，进程池的往返开销反而更大
+AI_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+PARALLEL_DIFFICULTIES = ("Hard",)
+# 可选的 AI 难度 (MCTS 适合大棋盘)
+AI_DIFFICULTIES = ["Easy", "Medium", "Hard", "MCTS"]
 
 # 颜色定义
 COLOR_BG = (245, 245, 245)
@@ -81,6 +88,12 @@ class GameGUI:
         self.ai_thinking = False
         self.ai_pending_move = None
         self.ai_delay_start = 0
+        self.ai_cancel = None       # 当前 AI 搜索的取消令牌
+        self.ai_generation = 0      # 搜索代数：取消或开新局后加一，旧线程的结果直接丢弃
+        self.ai_search_player = 0   # 正在思考的 AI 是几号玩家
+        self.ai_search_start = 0    # 本次 AI 搜索开始的时间
+        self.ai_last_stats = None   # 上一次 AI 搜索的 (玩家, AIPlayer.stats 副本)
+        self.show_engine_stats = False  # F3 切换：对局界面上显示 AI 搜索统计
 
         # UI 交互状态 (输入框、文件列表)
         self.input_text = ""        # 通用文本缓冲
@@ -174,14 +187,15 @@ class GameGUI:
         # 根据 mode 初始化 self.ai_p1, self.ai_p2 (PvAI 或 AIvAI)
         self.timer_start = time.time() - (self.time_limit_val - self.time_left)
         self.winner = None
-        self.ai_thinking = False
+        self.cancel_ai_search()
         self.ai_p1, self.ai_p2 = None, None
+        self.ai_last_stats = None
 
         if not is_online:
-            if mode == "PvAI": self.ai_p2 = AIPlayer(self.difficulty_1)
+            if mode == "PvAI": self.ai_p2 = self.create_ai(self.difficulty_1)
             elif mode == "AIvAI":
-                self.ai_p1 = AIPlayer(self.difficulty_1)
-                self.ai_p2 = AIPlayer(self.difficulty_2)
+                self.ai_p1 = self.create_ai(self.difficulty_1)
+                self.ai_p2 = self.create_ai(self.difficulty_2)
 
         # TODO 4: 布局与状态切换
         # 调用 self.resize_layout()
@@ -222,6 +236,11 @@ class GameGUI:
         if self.popup: return
         current_time = time.time()
 
+        # 离开对局 (退出、投降、存档等) 后，不再需要的 AI 搜索和后台思考立即中止
+        if self.state not in ("PLAYING", "PLAYING_AIvAI"):
+            if self.ai_thinking: self.cancel_ai_search()
+            elif self.ai_p2 is not None and self.ai_p2.is_pondering(): self.stop_ai_ponder()
+
         # 1. 网络消息处理
         if self.is_online or self.state.startswith("NET"):
             self.process_network_messages()
@@ -238,21 +257,27 @@ class GameGUI:
             #    检查 ai_pending_move，如果有值 -> attempt_move(col)
             elif self.game_mode == "PvAI" and self.turn == 2 and not self.is_online:
                 if not self.ai_thinking and self.ai_pending_move is None:
-                    self.ai_thinking = True
-                    threading.Thread(target=self.run_ai_thread, args=(2,), daemon=True).start()
+                    self.start_ai_thread(2)
                 if self.ai_pending_move is not None:
                     col = self.ai_pending_move
                     self.ai_pending_move = None
                     self.ai_thinking = False
                     if col is not None: self.attempt_move(col)
 
+            # 玩家思考时，AI 在后台预先搜索玩家可能的落子
+            elif self.game_mode == "PvAI" and self.turn == 1 and not self.is_online and self.ai_p2 and not self.winner:
+                self.ai_p2.start_ponder(self.match, 2)
+
             # TODO: 倒计时逻辑
             # if use_timer: 更新 time_left
             # 如果超时 -> switch_turn_logic()
             if self.use_timer and not self.winner:
                 elapsed = current_time - self.timer_start
                 self.time_left = max(0, self.time_limit_val - elapsed)
-                if self.time_left <= 0: self.switch_turn_logic()
+                if self.time_left <= 0:
+                    # AI 还在思考：中止搜索，下一帧走目前为止最好的一步
+                    if self.ai_thinking: self.ai_cancel.cancel()
+                    else: self.switch_turn_logic()
 
         # 3. AI 对战 AI 状态
         elif self.state == "PLAYING_AIvAI":
@@ -263,8 +288,7 @@ class GameGUI:
                 if not self.ai_thinking and self.ai_pending_move is None:
                     if self.ai_delay_start == 0: self.ai_delay_start = current_time
                     if current_time - self.ai_delay_start > random.uniform(0.3, 0.8):
-                        self.ai_thinking = True
-                        threading.Thread(target=self.run_ai_thread, args=(self.turn,), daemon=True).start()
+                        self.start_ai_thread(self.turn)
                 
                 if self.ai_pending_move is not None:
                     col = self.ai_pending_move
@@ -275,6 +299,7 @@ class GameGUI:
                 
                 if self.use_timer:
                     self.time_left = max(0, self.time_limit_val - (current_time - self.timer_start))
+                    if self.time_left <= 0 and self.ai_thinking: self.ai_cancel.cancel()
 
         # 4. 动画状态 (重点)
         elif self.state == "ANIMATING":
@@ -322,8 +347,8 @@ class GameGUI:
             elif mtype == "INIT":
                 self.init_game(msg.get("N", 8), "PvP", is_online=True, 
                                use_timer=msg.get("use_timer", True), time_limit=msg.get("time_limit", 30))
-                # 覆盖 board
-                if msg.get("board_matrix"): self.match.board = msg["board_matrix"]
+                # 覆盖 board (重新构造 Match，以便重建每列的落点索引)
+                if msg.get("board_matrix"): self.match = Match(self.N, board_data=msg["board_matrix"])
                 self.turn = msg.get("turn", 1)
                 self.time_left = msg.get("time_left", 30)
                 self.state = "PLAYING"
@@ -358,12 +383,48 @@ class GameGUI:
             self.is_online = False
             self.show_popup("Connection Lost", "ALERT", lambda: setattr(self, 'state', 'MAIN'))
 
-    def run_ai_thread(self, player_id):
+    def create_ai(self, difficulty):
+        """按难度创建 AI：只有 PARALLEL_DIFFICULTIES 中的难度使用多进程搜索"""
+        return AIPlayer(difficulty, workers=AI_WORKERS if difficulty in PARALLEL_DIFFICULTIES else 1)
+
+    def start_ai_thread(self, player_id):
+        """为本次搜索创建取消令牌并启动 AI 子线程"""
+        self.ai_thinking = True
+        self.ai_search_player = player_id
+        self.ai_search_start = time.time()
+        self.ai_cancel = CancelToken()
+        args = (player_id, self.ai_generation, self.ai_cancel)
+        threading.Thread(target=self.run_ai_thread, args=args, daemon=True).start()
+
+    def run_ai_thread(self, player_id, generation, cancel):
         """AI 子线程入口"""
         # TODO: 获取对应 AI 对象 -> 调用 get_best_move -> 存入 self.ai_pending_move
         ai = self.ai_p1 if player_id == 1 else self.ai_p2
-        move = ai.get_best_move(self.match, player_id)
-        self.ai_pending_move = move
+        move = ai.get_best_move(self.match, player_id, time_budget=self.ai_time_budget(), cancel=cancel)
+        # 搜索期间对局已经结束或换了新局，结果作废
+        if generation == self.ai_generation:
+            self.ai_last_stats = (player_id, dict(ai.stats))
+            self.ai_pending_move = move
+
+    def cancel_ai_search(self):
+        """中止正在进行的 AI 搜索和后台思考，并丢弃它们之后写回的结果"""
+        if self.ai_cancel is not None: self.ai_cancel.cancel()
+        self.ai_cancel = None
+        self.ai_generation += 1
+        self.ai_thinking = False
+        self.ai_pending_move = None
+        self.ai_delay_start = 0
+        self.stop_ai_ponder()
+
+    def stop_ai_ponder(self):
+        """真实落子到来时立即停止 AI 的后台思考"""
+        for ai in (self.ai_p1, self.ai_p2):
+            if ai is not None: ai.stop_ponder()
+
+    def ai_time_budget(self):
+        """AI 本步的思考时间：开启计时器时按本回合剩余时间计算，否则按每步时限计算"""
+        remaining = self.time_left if self.use_timer else self.time_limit_val
+        return AIPlayer.time_budget(remaining)
 
     # ================= 落子与动画逻辑 =================
 
@@ -382,6 +443,9 @@ class GameGUI:
         target_row = self.match.get_target_row(col)
         if target_row == -1: return
 
+        # 本地点击和网络 MOVE 消息都会走到这里，落子前停止后台思考 (ponder 读的是落子前的局面)
+        self.stop_ai_ponder()
+
         # TODO 3: 发送网络包 (如果是本地操作且联机)
         if self.is_online and not from_network:
             self.network.send({"type": "MOVE", "col": col, "player": self.turn})
@@ -507,6 +571,10 @@ class GameGUI:
                     if event.key == pygame.K_RETURN and self.popup['type'] == 'ALERT': self.popup = None
                     continue
 
+                if event.key == pygame.K_F3:
+                    self.show_engine_stats = not self.show_engine_stats
+                    continue
+
                 if self.state == "NEW_GAME":
                     if event.key == pygame.K_TAB:
                         order = ["TEXT", "OBS", "TIME"]
@@ -716,14 +784,14 @@ class GameGUI:
             y += 80
             lbl = "AI Diff:" if self.game_mode == "PvAI" else "AI 1:"
             self.screen.blit(self.font_mid.render(lbl, True, COLOR_TEXT), (cx-200, y+5))
-            for i, d in enumerate(["Easy", "Medium", "Hard"]):
+            for i, d in enumerate(AI_DIFFICULTIES):
                 c = COLOR_BTN if self.difficulty_1 != d else COLOR_BTN_HOVER
                 if self.draw_btn(pygame.Rect(cx-100+i*110, y, 100, 40), d, c): self.difficulty_1 = d
             
             if self.game_mode == "AIvAI":
                 y += 60
                 self.screen.blit(self.font_mid.render("AI 2:", True, COLOR_TEXT), (cx-200, y+5))
-                for i, d in enumerate(["Easy", "Medium", "Hard"]):
+                for i, d in enumerate(AI_DIFFICULTIES):
                     c = COLOR_BTN if self.difficulty_2 != d else COLOR_BTN_HOVER
                     if self.draw_btn(pygame.Rect(cx-100+i*110, y, 100, 40), d, c): self.difficulty_2 = d
 
@@ -793,10 +861,52 @@ class GameGUI:
             self.state = "DIALOG_SAVE"
             self.input_text = f"save_{int(time.time())%1000}"
         if self.draw_btn(pygame.Rect(w-140, 20, 120, 40), "Surrender", COLOR_BTN_RED):
+            self.cancel_ai_search()
             if self.is_online: self.network.send({"type":"SURRENDER"})
             self.winner = 3 - self.turn
             self.state = "GAMEOVER"
 
+        if self.show_engine_stats: self.draw_engine_stats()
+
+    def draw_engine_stats(self):
+        """
+        引擎统计浮层 (F3 开关)：AI 思考时显示本次搜索的实时数据，否则显示上一次搜索的结果。
+        """
+        if self.ai_thinking:
+            ai = self.ai_p1 if self.ai_search_player == 1 else self.ai_p2
+            if ai is None: return
+            # 搜索线程随时在更新 ai.stats，用时和速度按界面记下的开始时间现算
+            stats = ai.stats
+            elapsed = time.time() - self.ai_search_start
+            nps = stats.get("nodes", 0) / elapsed if elapsed > 0 else 0
+            title = f"P{self.ai_search_player} thinking..."
+        elif self.ai_last_stats is not None:
+            player, stats = self.ai_last_stats
+            elapsed, nps = stats.get("elapsed", 0), stats.get("nps", 0)
+            title = f"P{player} last search"
+        else:
+            return
+
+        lines = [title,
+                 f"Nodes: {stats.get('nodes', 0)}",
+                 f"Leaf evals: {stats.get('leaf_evals', 0)}",
+                 f"Cutoffs: {stats.get('cutoffs', 0)}",
+                 f"TT hits: {stats.get('tt_hits', 0)}",
+                 f"Depth: {stats.get('depth', 0)}",
+                 f"Time: {elapsed:.2f}s",
+                 f"NPS: {nps:.0f}"]
+        # 捷径命中 (战术预检 / 开局库 / 后台思考 / 残局求解) 时注明来源，
+        # 残局求解超时后回到普通搜索时另列求解器的开销
+        for key in ("tactic", "book", "ponder", "endgame", "endgame_nodes", "solve_time"):
+            if key in stats: lines.append(f"{key}: {stats[key]}")
+
+        line_h = self.font_small.get_height() + 2
+        panel = pygame.Surface((200, line_h * len(lines) + 16), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 160))
+        for i, text in enumerate(lines):
+            panel.blit(self.font_small.render(text, True, (255, 255, 255)), (10, 8 + i * line_h))
+        self.screen.blit(panel, (20, 80))
+
     def draw_board_area(self):
         """
         绘制棋盘与棋子 (包含动画棋子)
@@ -931,16 +1041,16 @@ class GameGUI:
         elif "AI" in self.edit_temp_mode:
             lbl = "AI Diff:" if self.edit_temp_mode == "PvAI" else "AI 1:"
             self.screen.blit(self.font_mid.render(lbl, True, COLOR_TEXT), (box.x+50, y+5))
-            for i, d in enumerate(["Easy", "Medium", "Hard"]):
+            for i, d in enumerate(AI_DIFFICULTIES):
                 c = COLOR_BTN if self.edit_temp_diff1 != d else COLOR_BTN_HOVER
-                if self.draw_btn(pygame.Rect(box.x+150+i*100, y, 90, 40), d, c, is_popup=True): self.edit_temp_diff1 = d
+                if self.draw_btn(pygame.Rect(box.x+130+i*90, y, 80, 40), d, c, is_popup=True): self.edit_temp_diff1 = d
             
             if self.edit_temp_mode == "AIvAI":
                 y += 60
                 self.screen.blit(self.font_mid.render("AI 2:", True, COLOR_TEXT), (box.x+50, y+5))
-                for i, d in enumerate(["Easy", "Medium", "Hard"]):
+                for i, d in enumerate(AI_DIFFICULTIES):
                     c = COLOR_BTN if self.edit_temp_diff2 != d else COLOR_BTN_HOVER
-                    if self.draw_btn(pygame.Rect(box.x+150+i*100, y, 90, 40), d, c, is_popup=True): self.edit_temp_diff2 = d
+                    if self.draw_btn(pygame.Rect(box.x+130+i*90, y, 80, 40), d, c, is_popup=True): self.edit_temp_diff2 = d
 
         if self.draw_btn(pygame.Rect(box.x+100, box.bottom-60, 100, 40), "Save", COLOR_BTN_GREEN, is_popup=True):
             storage.update_save_settings(self.edit_target_filename, self.edit_temp_mode, 
@@ -1,5 +1,6 @@
 import random
 import copy
+from zobrist import get_zobrist_keys
 
 class Match:
     def __init__(self, N: int, board_data=None, obstacles=None, num_obstacles=3):
@@ -13,6 +14,7 @@ class Match:
         self.N = N
         self.last_move = None  # 记录最后一步的位置 (row, col)，用于界面高亮
         self.history = []      # 记录每一步的落子 [(player, col), ...]，用于回放
+        self._undo_stack = []  # 记录每一步的 (row, col, 上一步的 last_move)，用于悔棋/AI 搜索回退
         
         # TODO 1: 初始化 self.board
         # 如果传入了 board_data，直接使用它。
@@ -35,6 +37,10 @@ class Match:
             else:
                 self._generate_obstacles(num_obstacles)
 
+        # 每列的下一个空位 (行号，-1 表示该列已满或入口被堵) 和局面哈希，落子时增量维护
+        self._zobrist = get_zobrist_keys(N)
+        self._rebuild_index()
+
     def _generate_obstacles(self, count):
         """
         内部方法：随机生成障碍物。
@@ -52,6 +58,37 @@ class Match:
         for each in obstacal_list:
             self.board[each[0]][each[1]] = 3
 
+    def __getstate__(self):
+        # Zobrist 键按 N 缓存在每个进程里，不需要随对象一起序列化 (多进程搜索时传递局面)
+        state = self.__dict__.copy()
+        del state['_zobrist']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._zobrist = get_zobrist_keys(self.N)
+
+    def _rebuild_index(self):
+        """
+        内部方法：扫描整个棋盘，重建 self.heights、可落子列数和 Zobrist 哈希 self.hash。
+        只在棋盘被整体替换 (构造、读档) 后调用，之后由 move / undo_move 增量维护。
+        哈希包含障碍物的位置，障碍物布局不同的局面哈希不同。
+        """
+        self.heights = []
+        for col in range(self.N):
+            row = -1
+            for i in range(self.N):
+                if self.board[i][col] != 0:
+                    break
+                row = i
+            self.heights.append(row)
+        self._open_columns = sum(1 for h in self.heights if h >= 0)
+        self.hash = self._zobrist.hash_board(self.board)
+        # 左右镜像后的棋盘的哈希，障碍物布局对称时用来识别互为镜像的局面
+        self.mirror_hash = self._zobrist.hash_board(self.board, mirror=True)
+        # 障碍物在对局中不会变化，AI 用它作为窗口表等缓存的键
+        self.obstacles = frozenset((r, c) for r in range(self.N) for c in range(self.N) if self.board[r][c] == 3)
+
     def copy(self):
         """
         深拷贝当前对象，主要用于 AI 在“脑海”里模拟下棋，不影响真实棋盘。
@@ -59,20 +96,25 @@ class Match:
         # TODO: 创建一个新的 Match 对象，并将当前的 self.board 深拷贝给新对象
         board = copy.deepcopy(self.board)
         new_match = Match(self.N, board)
+        new_match.history = list(self.history)
+        new_match.last_move = self.last_move
         return new_match
         
 
     def get_valid_locations(self):
         """
         AI 辅助方法：返回当前所有可以落子的列号列表。
-        条件：该列的第 0 行 (top) 必须是空 (0)。
+        条件：该列的第 0 行 (top) 必须是空 (0)，即 self.heights[col] != -1。
         """
-        # TODO: 遍历所有列，收集可以下棋的列号
-        column_list = []
-        for i in range(self.N):
-            if self.board[0][i] == 0:
-                column_list.append(i)
-        return column_list
+        return [col for col in range(self.N) if self.heights[col] >= 0]
+
+    def flat_board(self):
+        """按行展开成一维列表，格子 (r,c) 的下标为 r*N+c (供 AI 估值使用)"""
+        return [v for row in self.board for v in row]
+
+    def count_empty(self):
+        """还能落子的空格总数 (被障碍物挡住、永远落不到的格子不算)"""
+        return sum(h + 1 for h in self.heights)
 
     def get_target_row(self, col: int):
         """
@@ -83,16 +125,10 @@ class Match:
         # TODO 1: 边界检查 (col 是否在 0 到 N-1 之间)
         if not (col >= 0 and col <= self.N - 1):
             return -1
-        # TODO 2: 检查第 0 行是否被堵住 (若是，返回 -1)
-        if not self.board[0][col] == 0:
-            return -1
-        # TODO 3: 从第 1 行开始向下遍历，或者从第 N-1 行向上遍历。
-        # 逻辑：找到从上往下数，第一个不是 0 的格子，它的上面一格就是落点。
-        for i in range(self.N):
-            if self.board[i][col] != 0:
-                return i-1
-            if i == self.N - 1:
-                return i
+        # 落点由 self.heights 增量维护：从上往下数第一个非空格子的上面一格，
+        # 第 0 行被堵住时为 -1
+        return self.heights[col]
+
     def move(self, col: int, player: int):
         """
         执行落子操作。
@@ -107,20 +143,51 @@ class Match:
         #         否则返回 False
         if row != -1:
             self.board[row][col] = player
+            self.heights[col] = row - 1
+            if row == 0:
+                self._open_columns -= 1
+            self.hash ^= self._zobrist.cells[player][row * self.N + col]
+            self.mirror_hash ^= self._zobrist.cells[player][row * self.N + self.N - 1 - col]
+            self._undo_stack.append((row, col, self.last_move))
             self.last_move = (row, col)
             self.history.append((player, col))
             return True
         else:
             return False
 
-    def judge(self):
+    def undo_move(self):
+        """
+        撤销最后一步落子 (move 的逆操作)，原地恢复 board、history 和 last_move。
+        AI 搜索时配合 move 使用，整棵搜索树只需一个 Match 对象，不必每个节点都 copy。
+        :return: 成功返回 True，没有可撤销的步数返回 False
+        """
+        if not self._undo_stack:
+            return False
+        row, col, prev_last_move = self._undo_stack.pop()
+        self.hash ^= self._zobrist.cells[self.board[row][col]][row * self.N + col]
+        self.mirror_hash ^= self._zobrist.cells[self.board[row][col]][row * self.N + self.N - 1 - col]
+        self.board[row][col] = 0
+        self.heights[col] = row
+        if row == 0:
+            self._open_columns += 1
+        self.history.pop()
+        self.last_move = prev_last_move
+        return True
+
+    def judge(self, incremental=False):
         """
         判断游戏胜负。
+        :param incremental: 只检查经过 last_move 的四个方向 (O(1))。
+                            前提是落最后一步之前还没人获胜 (AI 搜索中总是成立)。
+                            没有 last_move 时退回全盘扫描。
         :return: (is_over, winner, win_positions)
                  - is_over: bool, 游戏是否结束
                  - winner: int, 获胜者 (1, 2, 或 0表示平局)
                  - win_positions: list, 获胜棋子的坐标列表 (用于界面画线)，平局为 None
         """
+        if incremental and self.last_move is not None:
+            return self._judge_last_move()
+
         # 辅助内嵌函数：检查列表是否有连续4个相同的非0、非障碍物棋子
         def check_line(line):
             # TODO: 遍历列表，检查 line[i] == line[i+1] == ... == line[i+3]
@@ -166,6 +233,28 @@ class Match:
         
         return (False, None, None)
 
+    def _judge_last_move(self):
+        """增量判胜：沿横、竖、两条斜线数出经过 last_move 的同色连续棋子"""
+        row, col = self.last_move
+        player = self.board[row][col]
+        N = self.N
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            # 先退到这条连线的起点，再往前数
+            r, c = row, col
+            while 0 <= r - dr < N and 0 <= c - dc < N and self.board[r - dr][c - dc] == player:
+                r, c = r - dr, c - dc
+            count = 0
+            while 0 <= r + count * dr < N and 0 <= c + count * dc < N and self.board[r + count * dr][c + count * dc] == player:
+                count += 1
+            if count >= 4:
+                win_positions = [(r + k * dr, c + k * dc) for k in range(4)]
+                return (True, player, win_positions)
+
+        if self._open_columns == 0:
+            return (True, 0, None)
+
+        return (False, None, None)
+
     def to_dict(self):
         """序列化：将对象转为字典，用于 JSON 保存"""
         # TODO: 返回包含 N, board, history 的字典
@@ -0,0 +1,230 @@
+# mcts.py
+# 蒙特卡洛树搜索 (UCT)：大棋盘上分支太多，alpha-beta 搜不深时改用随机对局统计胜率。
+import math
+import random
+import time
+
+from bitboard import BitBoard, winning_cells
+
+# UCT 探索系数
+EXPLORATION = 1.4
+
+# 没有给定思考时间时的默认模拟局数
+DEFAULT_PLAYOUTS = 3000
+
+# 每模拟这么多局检查一次时间和取消令牌
+CHECK_INTERVAL = 32
+
+
+class MCTSNode:
+    """
+    搜索树节点。
+    - player: 走到这个节点的那一步是谁下的 (wins 站在他的角度统计)
+    - untried: 还没有展开的列
+    - winner: 这一步之后棋局已经结束时为 1 / 2 / 0 (平局)，否则为 None
+    """
+    __slots__ = ("col", "player", "parent", "children", "untried", "wins", "visits", "winner")
+
+    def __init__(self, col, player, parent, untried, winner=None):
+        self.col = col
+        self.player = player
+        self.parent = parent
+        self.children = {}
+        self.untried = untried
+        self.wins = 0.0
+        self.visits = 0
+        self.winner = winner
+
+
+class MCTSEngine:
+    """
+    UCT 搜索，局面使用 BitBoard。
+    模拟对局 (playout) 直接在位棋盘的整数上进行：
+    - 轻量模式：完全随机落子；
+    - 重模式 (默认)：能赢就赢，对手下一步能赢就堵，否则随机。
+    两次调用之间保留搜索树：新局面是上次根局面之后又走了几步时，沿着这几步取出对应子树继续搜索。
+    """
+
+    def __init__(self, exploration=EXPLORATION, heavy_playouts=True, seed=None):
+        """
+        :param exploration: UCT 探索系数
+        :param heavy_playouts: 使用带必胜 / 必堵规则的模拟对局
+        :param seed: 随机种子，None 表示不固定
+        """
+        self.exploration = exploration
+        self.heavy_playouts = heavy_playouts
+        self.rng = random.Random(seed)
+        self.root = None
+        self._root_history = None
+        self._root_layout = None
+        # 统计：playouts 模拟局数，elapsed 用时 (秒)，playouts_per_sec 每秒模拟局数，
+        # tree_size 树中节点数，reused 是否复用了上一步的树
+        self.stats = {"playouts": 0, "elapsed": 0.0, "playouts_per_sec": 0.0, "tree_size": 0, "reused": False}
+
+    def _reuse_root(self, bb):
+        """如果 bb 是上次根局面之后又走了几步得到的，返回对应的子树，否则返回 None"""
+        if self.root is None or self._root_layout != (bb.N, bb.obstacle_mask):
+            return None
+        old = self._root_history
+        if len(bb.history) < len(old) or bb.history[:len(old)] != old:
+            return None
+        node = self.root
+        for player, col in bb.history[len(old):]:
+            node = node.children.get(col)
+            if node is None or node.player != player:
+                return None
+        return node
+
+    def search(self, match_obj, player, time_budget=None, playouts=None, cancel=None):
+        """
+        搜索并返回最佳列 (访问次数最多的子节点)。
+        :param match_obj: Match 或 BitBoard (不会被修改)
+        :param player: 轮到落子的一方
+        :param time_budget: 思考时间 (秒)
+        :param playouts: 模拟局数上限；两者都不给时使用 DEFAULT_PLAYOUTS
+        :param cancel: (选填) 取消令牌，cancelled 为真时停止搜索，返回目前最好的列
+        :return: 列号，没有可落子的列时返回 None
+        """
+        bb = BitBoard.from_match(match_obj) if not isinstance(match_obj, BitBoard) else match_obj.copy()
+        valid = bb.get_valid_locations()
+        if not valid:
+            return None
+        if time_budget is None and playouts is None:
+            playouts = DEFAULT_PLAYOUTS
+
+        start = time.time()
+        deadline = start + time_budget if time_budget is not None else None
+        root = self._reuse_root(bb)
+        reused = root is not None
+        if root is None or root.winner is not None:
+            root = MCTSNode(None, 3 - player, None, list(valid))
+        root.parent = None
+        self.root = root
+        self._root_history = list(bb.history)
+        self._root_layout = (bb.N, bb.obstacle_mask)
+
+        done = 0
+        while playouts is None or done < playouts:
+            if done % CHECK_INTERVAL == 0 and done:
+                if deadline is not None and time.time() > deadline:
+                    break
+                if cancel is not None and cancel.cancelled:
+                    break
+            self._iterate(bb, root)
+            done += 1
+
+        elapsed = time.time() - start
+        self.stats = {"playouts": done, "elapsed": elapsed,
+                      "playouts_per_sec": done / elapsed if elapsed > 0 else 0.0,
+                      "tree_size": self._count(root), "reused": reused}
+        if not root.children:
+            return self.rng.choice(valid)
+        # 已经能直接赢的子节点优先，否则取访问次数最多的
+        best = max(root.children.values(), key=lambda n: (n.winner == n.player, n.visits, n.wins))
+        return best.col
+
+    def _count(self, node):
+        total = 0
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            total += 1
+            stack.extend(n.children.values())
+        return total
+
+    def _iterate(self, bb, root):
+        """一次完整的 选择 - 展开 - 模拟 - 回传"""
+        node = root
+        moves = 0
+        # 选择：沿 UCT 值最大的子节点向下，直到遇到还能展开的节点或终局
+        while not node.untried and node.children and node.winner is None:
+            log_n = math.log(node.visits)
+            c = self.exploration
+            node = max(node.children.values(),
+                       key=lambda n: n.wins / n.visits + c * math.sqrt(log_n / n.visits))
+            bb.move(node.col, node.player)
+            moves += 1
+
+        # 展开：随机选一个没展开的列
+        if node.untried and node.winner is None:
+            col = node.untried.pop(self.rng.randrange(len(node.untried)))
+            mover = 3 - node.player
+            bb.move(col, mover)
+            moves += 1
+            if bb._find_four(bb.masks[mover]):
+                winner = mover
+            elif not bb.get_valid_locations():
+                winner = 0
+            else:
+                winner = None
+            child = MCTSNode(col, mover, node, bb.get_valid_locations() if winner is None else [], winner)
+            node.children[col] = child
+            node = child
+
+        # 模拟
+        if node.winner is not None:
+            winner = node.winner
+        else:
+            winner = self._playout(bb, 3 - node.player)
+
+        for _ in range(moves):
+            bb.undo_move()
+
+        # 回传：每个节点站在走到它的那一方的角度记分
+        while node is not None:
+            node.visits += 1
+            if winner == node.player:
+                node.wins += 1.0
+            elif winner == 0:
+                node.wins += 0.5
+            node = node.parent
+
+    def _playout(self, bb, player):
+        """
+        从当前局面随机下完一局 (不修改 bb)。
+        :param player: 轮到落子的一方
+        :return: 胜者 1 / 2，平局为 0
+        """
+        N, H = bb.N, bb.H
+        masks = [0, bb.masks[1], bb.masks[2]]
+        heights = list(bb.heights)
+        open_cols = [c for c in range(N) if heights[c] < N]
+        playable = 0
+        for c in open_cols:
+            playable |= 1 << (c * H + heights[c])
+        rng = self.rng
+        heavy = self.heavy_playouts
+        while open_cols:
+            if heavy:
+                # 能赢就赢；对手下一步能赢就堵住 (这样随机落子永远不会连成四子，不用再检查)
+                if winning_cells(masks[player], H) & playable:
+                    return player
+                block = winning_cells(masks[3 - player], H) & playable
+                if block:
+                    col = ((block & -block).bit_length() - 1) // H
+                else:
+                    col = open_cols[rng.randrange(len(open_cols))]
+            else:
+                col = open_cols[rng.randrange(len(open_cols))]
+            h = heights[col]
+            bit = 1 << (col * H + h)
+            masks[player] |= bit
+            heights[col] = h + 1
+            playable ^= bit
+            if h + 1 < N:
+                playable |= bit << 1
+            else:
+                open_cols.remove(col)
+            if not heavy and _has_four(masks[player], H):
+                return player
+            player = 3 - player
+        return 0
+
+
+def _has_four(mask, H):
+    """与 BitBoard._find_four 相同的移位判断，只返回是否有四连"""
+    for d in (1, H, H + 1, H - 1):
+        m = mask & (mask >> d)
+        if m & (m >> 2 * d):
+            return True
+    return False
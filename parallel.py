@@ -0,0 +1,235 @@
+# parallel.py
+# 根节点并行搜索：把根局面的各个候选列分给进程池里的多个工作进程，绕开 GIL 使用多核。
+import atexit
+import itertools
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from transposition import SharedTranspositionTable
+
+# 进程池在多次搜索之间保留 (热进程)，只有工作进程数变化时才重建
+_pool = None
+_pool_workers = 0
+_shared_alpha = None
+_shared_cancelled = None
+_search_ids = itertools.count(1)
+
+# 工作进程的启动方式：进程池第一次创建时通常在 GUI 的 AI 线程里，主进程还有 pygame 和
+# 网络线程，fork 会复制这些线程持有的锁，所以用 forkserver (不支持时用 spawn)
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# 主进程等待结果时检查取消令牌的间隔 (秒)
+CANCEL_POLL_INTERVAL = 0.02
+
+# 工作进程汇报给主进程、累加到 ai.stats 的计数项
+WORKER_COUNTERS = ("nodes", "leaf_evals", "cutoffs", "tt_hits")
+
+# 以下变量只在工作进程中使用
+_worker_alpha = None
+_worker_cancelled = None
+_worker_ais = {}
+
+
+class _WorkerCancel:
+    """
+    工作进程中的取消令牌 (搜索在每个节点都会检查)：主进程把被取消的搜索编号写入共享内存时中止；
+    其他列的结果使共享的 alpha 超过本列搜索窗口的下界时也中止，由 _search_column 用新窗口重搜。
+    """
+
+    def __init__(self, search_id, alpha):
+        self.search_id = search_id
+        self.alpha = alpha
+        self.alpha_raised = False
+
+    @property
+    def cancelled(self):
+        if _worker_cancelled.value == self.search_id:
+            return True
+        if _worker_alpha.value > self.alpha:
+            self.alpha_raised = True
+            return True
+        return False
+
+
+def _init_worker(shared_alpha, shared_cancelled):
+    """工作进程初始化：记下共享的 alpha 下界和被取消的搜索编号"""
+    global _worker_alpha, _worker_cancelled
+    _worker_alpha = shared_alpha
+    _worker_cancelled = shared_cancelled
+
+
+def _search_column(task):
+    """
+    工作进程入口：搜索根局面下某一列的子树。
+    每个进程按 AI 设置缓存一个 AIPlayer，置换表在多次搜索之间保持预热。
+    搜索过程中共享的 alpha 提高时，用提高后的窗口重新搜索本列 (置换表保留已经搜过的部分)。
+    :return: (分数, {WORKER_COUNTERS 中的计数项: 值}, 最后一次搜索使用的 alpha)，
+             超时时分数为 None；分数不大于该 alpha 时只是上界
+    """
+    from ai import AIPlayer
+
+    settings, search_id, shared_tt, match_obj, col, piece, depth, alpha, beta, deadline, node_limit = task
+    key = tuple(sorted(settings.items()))
+    entry = _worker_ais.get(key)
+    if entry is None:
+        entry = [AIPlayer(**settings), None]
+        _worker_ais[key] = entry
+    ai = entry[0]
+    if shared_tt is not None:
+        # 共享置换表的代数由发起搜索的主进程统一推进
+        ai.tt = shared_tt
+    elif entry[1] != search_id:
+        # 同一次搜索的多个列共用一代置换表条目，换了新的搜索才老化旧条目
+        entry[1] = search_id
+        if ai.tt is not None:
+            ai.tt.new_search()
+
+    counters = dict.fromkeys(WORKER_COUNTERS, 0)
+    while True:
+        # 其他工作进程已经找到的更好结果，可以直接收紧本列的搜索窗口
+        if _worker_alpha is not None:
+            alpha = max(alpha, _worker_alpha.value)
+        if alpha >= beta:
+            # 主进程已经在根节点剪枝，本列的结果不会再被使用
+            value = alpha
+            break
+        cancel = _WorkerCancel(search_id, alpha) if _worker_cancelled is not None else None
+        ai._cancel = cancel
+        limit = None if node_limit is None else max(1, node_limit - counters["nodes"])
+        value = ai.search_root_child(match_obj.copy(), col, piece, depth, alpha, beta, deadline, limit)
+        ai._cancel = None
+        for k in WORKER_COUNTERS:
+            counters[k] += ai.stats[k]
+        if value is not None or cancel is None or not cancel.alpha_raised:
+            break
+    return value, counters, alpha
+
+
+def get_pool(workers):
+    """获取 (必要时创建) 有 workers 个工作进程的进程池"""
+    global _pool, _pool_workers, _shared_alpha, _shared_cancelled
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        ctx = multiprocessing.get_context(POOL_START_METHOD)
+        # 工作进程在每个节点都会读取，只有主进程写入，不加锁
+        _shared_alpha = ctx.RawValue('d', -math.inf)
+        _shared_cancelled = ctx.RawValue('q', 0)
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                    initargs=(_shared_alpha, _shared_cancelled))
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+    """关闭进程池 (程序退出时自动调用)"""
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_workers = 0
+
+
+atexit.register(shutdown_pool)
+
+
+def parallel_root_search(ai, match_obj, piece, depth, alpha, beta, workers, deadline=None, node_limit=None):
+    """
+    根节点并行的 alpha-beta 搜索 (根节点是 AI 的 Max 层)。
+    同时最多有 workers 个列在搜索；每有一列返回结果就更新 alpha，
+    写入共享内存，之后开始的列都用更紧的窗口搜索。
+    :param ai: 发起搜索的 AIPlayer (提供走法排序和设置)
+    :param deadline: 截止时间 (time.time())，None 表示不限时
+    :param node_limit: 整次搜索的节点预算 (包括 ai.stats 中已经用掉的)，None 表示不限
+    :return: (best_col, value)
+    :raises SearchTimeout: 有列没能在截止时间前搜完、节点预算用完，或者 ai 当前的搜索被取消
+    """
+    from ai import SearchTimeout
+
+    pool = get_pool(workers)
+    # 上一轮迭代存入置换表的根局面最佳列排在最前面
+    tt_key, tt_move, mirrored = None, None, False
+    if ai.tt is not None:
+        tt_key, mirrored = ai._tt_key(match_obj, True, piece)
+        entry = ai.tt.probe(tt_key)
+        if entry is not None:
+            tt_move = ai._mirror_col(match_obj, entry[4], mirrored)
+    # 根局面左右对称时只需要搜一半的列
+    queue = ai.order_moves(match_obj, ai.symmetric_moves(match_obj, match_obj.get_valid_locations()), piece, tt_move)
+    order = {col: i for i, col in enumerate(queue)}
+    settings = ai.worker_settings()
+    shared_tt = ai.tt if isinstance(ai.tt, SharedTranspositionTable) else None
+    search_id = next(_search_ids)
+    _shared_alpha.value = alpha
+    alpha_orig = alpha
+
+    best_col, best_value = queue[0], -math.inf
+    pending = {}
+    # 正在搜索的列各自分到的节点预算
+    reserved = {}
+    timed_out = False
+    stopped = False
+    while queue or pending:
+        while queue and len(pending) < workers and not stopped:
+            col = queue.pop(0)
+            budget = None
+            if node_limit is not None:
+                # 剩下的预算 (扣除正在搜索的列已经分到的部分) 平分给这一列和还在排队的列
+                free = node_limit - ai.stats["nodes"] - sum(reserved.values())
+                budget = max(1, free // (len(queue) + 1))
+            task = (settings, search_id, shared_tt, match_obj, col, piece, depth, alpha, beta, deadline, budget)
+            future = pool.submit(_search_column, task)
+            pending[future] = col
+            reserved[future] = budget or 0
+        if not pending:
+            break
+        done, _ = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+        if ai._cancel is not None and ai._cancel.cancelled:
+            # 通知工作进程中止这次搜索，不再等待它们的结果
+            _shared_cancelled.value = search_id
+            for future in pending:
+                future.cancel()
+            raise SearchTimeout()
+        for future in done:
+            col = pending.pop(future)
+            budget = reserved.pop(future)
+            if future.cancelled():
+                continue
+            value, counters, searched_alpha = future.result()
+            for k, v in counters.items():
+                ai.stats[k] += v
+            if stopped:
+                # 已经剪枝或超时，被中止的列的结果不再使用
+                continue
+            if (value is None and node_limit is not None and counters["nodes"] >= budget
+                    and ai.stats["nodes"] < node_limit and (deadline is None or time.time() < deadline)):
+                # 只是用完了分给这一列的份额，整次搜索的预算还有剩余：排回队首，
+                # 等其他列让出预算后接着搜 (已经搜过的部分留在置换表里)
+                queue.insert(0, col)
+                continue
+            if value is None or (node_limit is not None and ai.stats["nodes"] >= node_limit):
+                timed_out = True
+                continue
+            # 分数相同时和串行搜索一样，取排序靠前的列 (分数不大于搜索窗口下界时只是上界，不算相同)
+            if value > best_value or (value == best_value and value > searched_alpha
+                                      and order[col] < order[best_col]):
+                best_col, best_value = col, value
+            if best_value > alpha:
+                alpha = best_value
+                _shared_alpha.value = alpha
+        if (alpha >= beta or timed_out) and not stopped:
+            # 通知正在运行的列立即中止 (future.cancel() 只能取消还没开始的)，
+            # 剩下的 pending 很快返回，随后退出循环
+            stopped = True
+            queue = []
+            _shared_cancelled.value = search_id
+            for future in pending:
+                future.cancel()
+
+    if timed_out:
+        raise SearchTimeout()
+    # 和串行搜索一样记下根局面的结果，供下一轮迭代排序和 fallback_move 使用
+    if tt_key is not None and best_value > -math.inf:
+        ai._tt_store(tt_key, depth, best_value, ai._mirror_col(match_obj, best_col, mirrored), alpha_orig, beta)
+    return best_col, best_value
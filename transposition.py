@@ -0,0 +1,179 @@
+import struct
+from multiprocessing import shared_memory
+
+# 置换表条目的边界类型
+EXACT = 0   # 精确值
+LOWER = 1   # 下界 (发生了 beta 剪枝，真实值 >= value)
+UPPER = 2   # 上界 (所有走法都没超过 alpha，真实值 <= value)
+
+# 默认容量 (条目数)
+DEFAULT_TT_SIZE = 1 << 18
+
+
+class TranspositionTable:
+    """
+    定长置换表：以 Zobrist 哈希为键，记录搜索过的局面。
+
+    内存上限固定：表是一个长度为 max_entries 的数组，哈希取模决定槽位，
+    不会随对局变长而增长。槽位冲突时的替换策略：
+    1. 空槽位、同一局面，直接覆盖；
+    2. 旧条目来自之前的搜索 (generation 不同)，视为过期，直接覆盖；
+    3. 否则保留搜索深度更深的条目 (深度优先)。
+
+    条目格式: (key, depth, flag, value, best_move, generation)
+    """
+
+    def __init__(self, max_entries=DEFAULT_TT_SIZE):
+        """
+        :param max_entries: 最大条目数 (>0)
+        """
+        self.max_entries = max_entries
+        self.slots = [None] * max_entries
+        self.generation = 0
+
+    def new_search(self):
+        """开始新一轮搜索：旧条目仍可命中，但在冲突时优先被替换"""
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * self.max_entries
+        self.generation = 0
+
+    def probe(self, key):
+        """
+        查找局面。
+        :return: 条目元组，未命中返回 None
+        """
+        entry = self.slots[key % self.max_entries]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, flag, value, best_move):
+        """写入局面 (按替换策略决定是否覆盖已有条目)"""
+        idx = key % self.max_entries
+        old = self.slots[idx]
+        if old is None or old[0] == key or old[5] != self.generation or depth >= old[1]:
+            self.slots[idx] = (key, depth, flag, value, best_move, self.generation)
+
+    def __len__(self):
+        return sum(1 for e in self.slots if e is not None)
+
+
+# 共享内存置换表的条目格式：(校验字, 数据字, 分数的二进制位)，每条 24 字节
+_SHARED_ENTRY = struct.Struct('<QQQ')
+_SHARED_HEADER = struct.Struct('<Q')  # 表头：当前搜索代数 generation
+_DOUBLE = struct.Struct('<d')
+_U64 = struct.Struct('<Q')
+_VALID_BIT = 1 << 63
+_MASK64 = (1 << 64) - 1
+
+# 每个进程里已经连接的共享表 {name: SharedTranspositionTable}，避免每个任务重复连接。
+# 只保留最近的几张 (例如 AI 对战 AI 时两个 AI 各一张)，更早的断开，防止对局多了内存越占越多
+_attached_tables = {}
+MAX_ATTACHED_TABLES = 2
+
+
+def _attach_shared_table(name, max_entries):
+    """在工作进程中按名字连接共享置换表 (pickle 反序列化时调用)"""
+    table = _attached_tables.get(name)
+    if table is None:
+        while len(_attached_tables) >= MAX_ATTACHED_TABLES:
+            oldest = next(iter(_attached_tables))
+            _attached_tables.pop(oldest).close()
+        table = SharedTranspositionTable(max_entries, name=name)
+        _attached_tables[name] = table
+    return table
+
+
+class SharedTranspositionTable:
+    """
+    基于 multiprocessing.shared_memory 的置换表，供多进程搜索的所有工作进程共用 (lazy SMP)。
+    接口与 TranspositionTable 相同，总内存固定为 8 + 24 * max_entries 字节，与进程数无关。
+
+    无锁更新：每个条目写入 (key ^ data ^ value, data, value) 三个 64 位字，
+    读取时用 data 和 value 还原 key 并与要查的 key 比较。
+    另一个进程写到一半的条目无法通过校验，等同于未命中，不需要加锁。
+
+    数据字: depth (8 位) | flag (2 位) | best_move+1 (8 位) | generation (16 位) | 有效位 (第 63 位)
+    """
+
+    def __init__(self, max_entries=DEFAULT_TT_SIZE, name=None):
+        """
+        :param max_entries: 最大条目数
+        :param name: 为 None 时创建新的共享内存 (本进程负责释放)；否则连接已有的共享内存
+        """
+        self.max_entries = max_entries
+        size = _SHARED_HEADER.size + _SHARED_ENTRY.size * max_entries
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._shm.buf[:size] = bytes(size)
+        else:
+            # 连接方只 close 不 unlink；工作进程与主进程共用同一个资源回收器，由创建者负责释放
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.name = self._shm.name
+        self._buf = self._shm.buf
+
+    def __reduce__(self):
+        # 传给工作进程时只传名字，由对方连接同一块共享内存
+        return (_attach_shared_table, (self.name, self.max_entries))
+
+    @property
+    def generation(self):
+        return _SHARED_HEADER.unpack_from(self._buf, 0)[0]
+
+    def new_search(self):
+        _SHARED_HEADER.pack_into(self._buf, 0, (self.generation + 1) & 0xFFFF)
+
+    def clear(self):
+        size = _SHARED_HEADER.size + _SHARED_ENTRY.size * self.max_entries
+        self._buf[:size] = bytes(size)
+
+    def _read(self, idx):
+        """读取并校验槽位，返回 (key, depth, flag, value, best_move, generation) 或 None"""
+        check, data, vbits = _SHARED_ENTRY.unpack_from(self._buf, _SHARED_HEADER.size + idx * _SHARED_ENTRY.size)
+        if not data & _VALID_BIT:
+            return None
+        move = ((data >> 10) & 0xFF) - 1
+        value = _DOUBLE.unpack(_U64.pack(vbits))[0]
+        return (check ^ data ^ vbits, data & 0xFF, (data >> 8) & 0x3, value,
+                None if move < 0 else move, (data >> 18) & 0xFFFF)
+
+    def probe(self, key):
+        key &= _MASK64
+        entry = self._read(key % self.max_entries)
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, flag, value, best_move):
+        key &= _MASK64
+        idx = key % self.max_entries
+        generation = self.generation
+        old = self._read(idx)
+        if old is None or old[0] == key or old[5] != generation or depth >= old[1]:
+            move = 0 if best_move is None else best_move + 1
+            data = _VALID_BIT | min(depth, 0xFF) | (flag << 8) | (move << 10) | (generation << 18)
+            vbits = _U64.unpack(_DOUBLE.pack(value))[0]
+            _SHARED_ENTRY.pack_into(self._buf, _SHARED_HEADER.size + idx * _SHARED_ENTRY.size,
+                                    key ^ data ^ vbits, data, vbits)
+
+    def __len__(self):
+        return sum(1 for i in range(self.max_entries) if self._read(i) is not None)
+
+    def close(self):
+        """断开共享内存；创建者同时释放它"""
+        if self._shm is None:
+            return
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,77 @@
+import random
+
+# 固定种子：同一个 N 在任何进程、任何机器上生成的键都相同，
+# 这样哈希值可以跨进程共享 (多进程搜索) 或写入文件 (开局库)
+ZOBRIST_SEED = 0x6C34
+
+# 棋子种类：1 / 2 为玩家，3 为障碍物 (下标 0 留空)
+PIECE_KINDS = 4
+
+_KEYS_CACHE = {}
+
+# 障碍物布局是否左右对称 {(N, 障碍物): bool}，最多保留 SYMMETRY_CACHE_SIZE 种布局
+SYMMETRY_CACHE_SIZE = 32
+_SYMMETRY_CACHE = {}
+
+
+class ZobristKeys:
+    """
+    一组 Zobrist 随机键。
+    - cells[piece][r*N+c]: 格子 (r,c) 上放置 piece 对应的 64 位键
+    - to_move[player]: 轮到 player 落子时异或进哈希
+    - perspective[piece]: 搜索方 (AI 持有的棋子) 不同，估值也不同，需要区分
+    """
+
+    def __init__(self, N: int):
+        rng = random.Random(ZOBRIST_SEED * 1000 + N)
+        self.N = N
+        self.cells = [[rng.getrandbits(64) for _ in range(N * N)] for _ in range(PIECE_KINDS)]
+        self.cells[0] = [0] * (N * N)
+        self.to_move = [0, rng.getrandbits(64), rng.getrandbits(64)]
+        self.perspective = [0, rng.getrandbits(64), rng.getrandbits(64)]
+
+    def hash_board(self, board, mirror=False):
+        """
+        对整个二维棋盘计算哈希 (只在构造局面时调用一次，之后增量更新)。
+        :param mirror: 计算左右镜像后的棋盘的哈希 (格子 (r,c) 使用 (r,N-1-c) 的键)
+        """
+        h = 0
+        N = self.N
+        for r in range(N):
+            for c in range(N):
+                v = board[r][c]
+                if v:
+                    h ^= self.cells[v][r * N + (N - 1 - c if mirror else c)]
+        return h
+
+
+def mirror_symmetric(N, obstacles):
+    """障碍物布局关于中间列左右对称 (没有障碍物时总是对称)"""
+    cache_key = (N, obstacles)
+    symmetric = _SYMMETRY_CACHE.get(cache_key)
+    if symmetric is None:
+        symmetric = all((r, N - 1 - c) in obstacles for r, c in obstacles)
+        if len(_SYMMETRY_CACHE) >= SYMMETRY_CACHE_SIZE:
+            _SYMMETRY_CACHE.clear()
+        _SYMMETRY_CACHE[cache_key] = symmetric
+    return symmetric
+
+
+def canonical_hash(match_obj):
+    """
+    局面的规范哈希：布局左右对称时，互为镜像的两个局面取同一个值 (两个哈希中较小的)。
+    :param match_obj: Match 或 BitBoard (需要 hash / mirror_hash / obstacles)
+    :return: (哈希, 是否取的是镜像)。取镜像时，按这个哈希记下的列号都是镜像后的列号
+    """
+    if match_obj.mirror_hash < match_obj.hash and mirror_symmetric(match_obj.N, match_obj.obstacles):
+        return match_obj.mirror_hash, True
+    return match_obj.hash, False
+
+
+def get_zobrist_keys(N: int):
+    """获取 N x N 棋盘的 Zobrist 键 (按 N 缓存)"""
+    keys = _KEYS_CACHE.get(N)
+    if keys is None:
+        keys = ZobristKeys(N)
+        _KEYS_CACHE[N] = keys
+    return keys